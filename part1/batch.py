@@ -0,0 +1,18 @@
+#!/usr/local/bin/python3
+# batch.py : Solves many boards of solver2021.py at once, over a pool of worker processes
+#
+# The solver2021.py command line must stay as it is, so batch mode lives here (see solve_batch).
+#
+# python3 batch.py boards.txt                           # one JSON line per board, in input order
+# python3 batch.py boards.txt --workers 4 --timeout 30 --engine astar --heuristic h1
+# cat boards.txt | python3 batch.py - --stats           # read standard input, add the search statistics
+#
+# A boards file holds rows*cols numbers per board (20 on the 4x5 puzzle), on one line or over several.
+#
+
+import sys
+import solver2021
+
+
+if __name__ == "__main__":
+    sys.exit(solver2021.batch_main(sys.argv[1:]))
@@ -0,0 +1,220 @@
+#!/usr/local/bin/python3
+# benchmark.py : Benchmarks for the search engines and heuristics of solver2021.py
+#
+# Boards are generated by undoing seeded random moves from the goal, so every run sees the same boards. Each
+# engine/heuristic combination solves each board in its own process, with a time limit and a memory limit, and the
+# report gives the solution length against the shortest known one, nodes per second and peak memory.
+#
+# python3 benchmark.py                                  # run and print the report
+# python3 benchmark.py --save-baseline                  # ... and store the results as the baseline
+# python3 benchmark.py --baseline benchmark_baseline.json   # ... and flag regressions against a stored baseline
+#
+
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import resource
+import multiprocessing
+import solver2021
+
+DEFAULT_COMBINATIONS = ["idastar:h3", "astar:h3", "numpy:h3", "bidirectional:-", "astar:h1"]
+OPTIMAL_COMBINATIONS = {"idastar:h3", "astar:h3", "numpy:h3", "bidirectional:-"}   # always give shortest solutions
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+def generate_board(depth, seed, shape=(solver2021.ROWS, solver2021.COLS)):
+    """
+    Returns a flat board reached from the goal by undoing <depth> random moves, so it can be solved in at most depth
+    moves. The same depth, seed and shape always give the same board
+    """
+    puzzle = solver2021.get_puzzle(*shape)
+    rng = random.Random("%d-%d" % (seed, depth))
+    board = puzzle.goal
+    for _ in range(depth):
+        board = solver2021.apply_move(board, rng.choice(puzzle.undo_moves))
+    return puzzle.unpack(board)
+
+
+def generate_boards(depths, per_depth, seed, shape=(solver2021.ROWS, solver2021.COLS)):
+    """
+    Returns a list of (board id, walk depth, board), per_depth boards for every depth
+    """
+    boards = []
+    for depth in depths:
+        for i in range(per_depth):
+            boards.append(("d%02d-%d" % (depth, i), depth, generate_board(depth, seed * 1000 + i, shape)))
+    return boards
+
+
+def run_one(connection, board, engine, heuristic, memory_limit, shape):
+    """
+    Runs in a child process - solves the board under an address space limit (in MB) and sends back the result
+    """
+    if memory_limit:
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    try:
+        moves, stats = solver2021.solve(board, heuristic if heuristic != "-" else "h1", engine, return_stats=True,
+                                        shape=shape)
+        result = {"status": "solved", "length": len(moves), "stats": stats.as_dict()}
+    except MemoryError:
+        result = {"status": "memory"}
+    except Exception as error:
+        result = {"status": "error", "error": repr(error)}
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    connection.send(result)
+    connection.close()
+
+
+def run_combination(board, combination, time_limit, memory_limit, shape):
+    """
+    Solves a board with one engine:heuristic combination in a separate process, killing it after time_limit seconds.
+    Returns the result dictionary of run_one, with the wall clock seconds and nodes (generated) per second
+    """
+    engine, heuristic = combination.split(":")
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=run_one, args=(sender, board, engine, heuristic, memory_limit, shape))
+    start = time.perf_counter()
+    process.start()
+    sender.close()
+    result = {"status": "timeout"}
+    if receiver.poll(time_limit):
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = {"status": "crashed"}
+    seconds = time.perf_counter() - start
+    if process.is_alive():
+        process.kill()
+    process.join()
+    result["seconds"] = seconds
+    if result["status"] == "solved":
+        search_seconds = result["stats"]["phases"].get("search", 0.0)
+        result["nodes_per_second"] = result["stats"]["generated"] / search_seconds if search_seconds else None
+    return result
+
+
+def run_benchmark(boards, combinations, time_limit, memory_limit, shape=(solver2021.ROWS, solver2021.COLS)):
+    """
+    Returns {board id: {"depth", "board", "optimum", "results": {combination: result}}}. optimum is the shortest
+    solution found by a combination of OPTIMAL_COMBINATIONS, None when none of them finished
+    """
+    solver2021.get_puzzle(*shape).pattern_databases()   # built once here, the child processes map the same files
+    report = {}
+    for board_id, depth, board in boards:
+        results = {}
+        for combination in combinations:
+            results[combination] = run_combination(board, combination, time_limit, memory_limit, shape)
+            print_row(board_id, depth, combination, results[combination])
+        lengths = [result["length"] for combination, result in results.items()
+                   if combination in OPTIMAL_COMBINATIONS and result["status"] == "solved"]
+        report[board_id] = {"depth": depth, "board": list(board), "optimum": min(lengths) if lengths else None,
+                            "results": results}
+    return report
+
+
+def print_row(board_id, depth, combination, result):
+    if result["status"] == "solved":
+        rate = result["nodes_per_second"]
+        print("%-8s walk %2d  %-18s %5d moves %9.3fs %10s nodes/s %8.1f MB" % (
+            board_id, depth, combination, result["length"], result["seconds"],
+            "%.0f" % rate if rate is not None else "-", result["peak_rss_mb"]), flush=True)
+    else:
+        print("%-8s walk %2d  %-18s %s after %.3fs" % (board_id, depth, combination, result["status"],
+                                                       result["seconds"]), flush=True)
+
+
+def find_regressions(report, baseline, tolerance):
+    """
+    Compares a report with a stored one. A combination regresses on a board if it no longer solves it, finds a longer
+    solution, or takes more than tolerance times the baseline time. Returns a list of messages
+    """
+    regressions = []
+    for board_id, entry in report.items():
+        if board_id not in baseline or baseline[board_id]["board"] != entry["board"]:
+            continue
+        for combination, result in entry["results"].items():
+            before = baseline[board_id]["results"].get(combination)
+            if before is None or before["status"] != "solved":
+                continue
+            if result["status"] != "solved":
+                regressions.append("%s %s: %s, was solved" % (board_id, combination, result["status"]))
+            elif result["length"] > before["length"]:
+                regressions.append("%s %s: %d moves, was %d" % (board_id, combination, result["length"],
+                                                                before["length"]))
+            elif result["seconds"] > before["seconds"] * tolerance:
+                regressions.append("%s %s: %.3fs, was %.3fs" % (board_id, combination, result["seconds"],
+                                                                before["seconds"]))
+    return regressions
+
+
+def print_summary(report):
+    """
+    Prints, for every combination, the boards solved, how many solutions were as short as the shortest known, the
+    total time and the median nodes per second
+    """
+    combinations = []
+    for entry in report.values():
+        combinations += [combination for combination in entry["results"] if combination not in combinations]
+    print("\n%-18s %8s %8s %10s %12s" % ("combination", "solved", "optimal", "seconds", "nodes/s"))
+    for combination in combinations:
+        solved = optimal = 0
+        seconds = 0.0
+        rates = []
+        for entry in report.values():
+            result = entry["results"].get(combination)
+            if result is None or result["status"] != "solved":
+                continue
+            solved += 1
+            optimal += entry["optimum"] is not None and result["length"] == entry["optimum"]
+            seconds += result["seconds"]
+            if result["nodes_per_second"] is not None:
+                rates.append(result["nodes_per_second"])
+        rate = sorted(rates)[len(rates) // 2] if rates else None
+        print("%-18s %4d/%-3d %8d %10.3f %12s" % (combination, solved, len(report), optimal, seconds,
+                                                  "%.0f" % rate if rate is not None else "-"))
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Benchmark the solver2021.py engines and heuristics")
+    parser.add_argument("--depths", type=int, nargs="+", default=list(range(5, 31, 5)),
+                        help="random walk depths of the generated boards")
+    parser.add_argument("--boards", type=int, default=2, help="boards per depth")
+    parser.add_argument("--seed", type=int, default=2021)
+    parser.add_argument("--shape", type=solver2021.parse_shape, default=(solver2021.ROWS, solver2021.COLS),
+                        help="board size as ROWSxCOLS, e.g. 3x3")
+    parser.add_argument("--combinations", nargs="+", default=DEFAULT_COMBINATIONS,
+                        help="engine:heuristic pairs, e.g. idastar:h3 (bidirectional ignores the heuristic, - for none)")
+    parser.add_argument("--time-limit", type=float, default=30, help="seconds per board and combination")
+    parser.add_argument("--memory-limit", type=int, default=2048, help="MB of address space per run, 0 for none")
+    parser.add_argument("--baseline", default=None, help="stored report to check for regressions")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None,
+                        help="store this report as the baseline (default %s)" % DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown against the baseline")
+    parser.add_argument("--output", default=None, help="write the full report as JSON")
+    options = parser.parse_args(arguments)
+
+    boards = generate_boards(options.depths, options.boards, options.seed, options.shape)
+    report = run_benchmark(boards, options.combinations, options.time_limit, options.memory_limit, options.shape)
+    print_summary(report)
+
+    for path in (options.output, options.save_baseline):
+        if path:
+            with open(path, "w") as file:
+                json.dump(report, file, indent=1)
+
+    if options.baseline:
+        with open(options.baseline, "r") as file:
+            regressions = find_regressions(report, json.load(file), options.tolerance)
+        print("\n%d regression(s)" % len(regressions))
+        for message in regressions:
+            print("  " + message)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -7,23 +7,332 @@
 #
 
 import sys
+import os
 import numpy as np
 import math
+import heapq
+import itertools
+import functools
+import collections
+import multiprocessing
+import signal
+import time
+import json
+import argparse
+import dbm
+import contextlib
 
 ROWS = 4
 COLS = 5
 
 
-def updatemove(state):
+# Boards are stored as a single packed integer - the tile at position p (counted row by row from the top left corner)
+# is kept as (tile - 1) in bits [bits * p, bits * (p + 1)), bits being 5 on a 4x5 board. This is hashable, cheap to
+# copy, and a row or column rotation only needs a couple of mask and shift operations
+#
+# Everything that depends on the size of the board (move tables, goal, heuristic tables, pattern databases) is kept in
+# a Puzzle, built once per size by get_puzzle and shared by every search on boards of that size
+PDB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdb")
+PDB_MAX_ENTRIES = 1 << 24               # largest pattern database, in entries (bytes)
+UNREACHED = 255
+
+
+class Puzzle:
+    """
+    The precomputed tables for boards of a given number of rows and columns. Counting from 0, even rows move left and
+    odd rows move right, even columns move up and odd columns move down, since every row or column can only move 1 way
+    """
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.bits = max(1, (self.size - 1).bit_length())
+        self.tile_mask = (1 << self.bits) - 1
+        self.moves = self.build_moves()
+        self.undo_moves = [self.undo_move(move) for move in self.moves]
+        self.move_names = {move[0]: move for move in self.moves}
+        self.goal = self.pack(range(1, self.size + 1))
+        self.manhattan_terms = self.build_manhattan_terms()
+        self.row_tiles = [set(range(i * cols + 1, (i + 1) * cols + 1)) for i in range(rows)]
+        self.col_tiles = [set(range(j + 1, self.size + 1, cols)) for j in range(cols)]
+        self.followers, self.repeats = self.build_move_order()
+        self.permutations = self.build_permutations()
+        self.pattern_groups = self.build_pattern_groups()
+        self.pdb_weights = self.build_pdb_weights()
+        self.tables = None                  # pattern databases, loaded by pattern_databases
+        self.tiles_per_word = 64 // self.bits
+        self.key_dtype = np.dtype([("w%d" % w, np.uint64) for w in range(-(-self.size // self.tiles_per_word))])
+
+    def pack(self, tiles):
+        """
+        Packs a flat sequence of tiles (numbers 1 - rows*cols, row by row) into an integer
+        """
+        packed = 0
+        for position, tile in enumerate(tiles):
+            packed |= (tile - 1) << (self.bits * position)
+        return packed
+
+    def solvable(self, tiles):
+        """
+        Returns False for boards that can't reach the goal. Moving a line is a cycle of its length, an even permutation
+        when the length is odd, so when rows and cols are both odd (3x3, 5x5 ..) only boards that are an even
+        permutation of the goal can be solved - the search would never end on the others
+        """
+        if self.rows % 2 == 0 or self.cols % 2 == 0:
+            return True
+        tiles = list(tiles)
+        swaps = 0
+        for position in range(self.size):
+            while tiles[position] != position + 1:
+                target = tiles[position] - 1
+                tiles[position], tiles[target] = tiles[target], tiles[position]
+                swaps += 1
+        return swaps % 2 == 0
+
+    def unpack(self, packed):
+        """
+        Returns the flat tuple of tiles stored in a packed board
+        """
+        return tuple(((packed >> (self.bits * position)) & self.tile_mask) + 1 for position in range(self.size))
+
+    def build_moves(self):
+        """
+        Builds the table of the <no. of rows + no. of columns> possible moves. Each move is a tuple (name, keep mask,
+        groups, changes) - every group is a mask of positions whose tiles all travel the same distance, with the number
+        of bits to shift them left or right, so a move is applied as (board & keep) | ((board & mask) << left) >> right
+        for each group. changes lists (bit offset, old position, new position) for every tile moved, used to update
+        heuristics incrementally
+        """
+        rows, cols, bits = self.rows, self.cols, self.bits
+        permutations = []                   # (name, list with the old position of the tile at every new position)
+        for i in range(rows):
+            positions = [i * cols + j for j in range(cols)]
+            if i % 2 == 1:
+                permutations.append(('R' + str(i + 1), positions, positions[-1:] + positions[:-1]))
+            else:
+                permutations.append(('L' + str(i + 1), positions, positions[1:] + positions[:1]))
+        for j in range(cols):
+            positions = [i * cols + j for i in range(rows)]
+            if j % 2 == 1:
+                permutations.append(('D' + str(j + 1), positions, positions[-1:] + positions[:-1]))
+            else:
+                permutations.append(('U' + str(j + 1), positions, positions[1:] + positions[:1]))
+
+        full_mask = (1 << (bits * self.size)) - 1
+        moves = []
+        for name, new_positions, old_positions in permutations:
+            groups = {}
+            moved = 0
+            for new, old in zip(new_positions, old_positions):
+                shift = bits * (new - old)
+                groups[shift] = groups.get(shift, 0) | (self.tile_mask << (bits * old))
+                moved |= self.tile_mask << (bits * old)
+            moves.append((name, full_mask & ~moved,
+                          tuple((mask, max(shift, 0), max(-shift, 0)) for shift, mask in groups.items()),
+                          tuple((bits * old, old, new) for new, old in zip(new_positions, old_positions))))
+        return moves
+
+    def undo_move(self, move):
+        """
+        Returns the move which takes the board back to where it was before the given move, in the same form as moves
+        """
+        name, keep, groups, changes = move
+        return (name, keep, tuple(((mask << left) >> right, right, left) for mask, left, right in groups),
+                tuple((self.bits * new, new, old) for _, old, new in changes))
+
+    def build_manhattan_terms(self):
+        """
+        Returns a table indexed by [tile - 1][position] with the distance term h1 adds for that tile when it is at that
+        position on the board
+        """
+        terms = []
+        for tile in range(self.size):
+            goal_row, goal_col = divmod(tile, self.cols)
+            terms.append(tuple(abs(position // self.cols - goal_row + position % self.cols - goal_col)
+                               for position in range(self.size)))
+        return terms
+
+    def manhattan_sum(self, board):
+        """
+        Returns the sum of the distance terms of all the tiles of a packed board, computed from scratch
+        """
+        total = 0
+        for position in range(self.size):
+            total += self.manhattan_terms[(board >> (self.bits * position)) & self.tile_mask][position]
+        return total
+
+    def build_move_order(self):
+        """
+        Returns, for every move, the indexes of the moves which may follow it in idastar, and the number of times it can
+        be repeated in a row. A row turned <no. of columns> times (or a column <no. of rows> times) is back where it
+        started, so longer runs are never useful. Moves on different rows commute, as do moves on different columns, so
+        only the order with the smaller row/column first is tried
+        """
+        followers = []
+        for m in range(len(self.moves)):
+            row_move = m < self.rows
+            followers.append(tuple(n for n in range(len(self.moves)) if (n < self.rows) != row_move or n >= m))
+        return followers, [self.cols if m < self.rows else self.rows for m in range(len(self.moves))]
+
+    def build_permutations(self):
+        """
+        Returns the moves as a (moves, rows*cols) array of the old position of the tile found at every position after
+        the move, so boards[:, permutations[m]] makes move m on a whole array of boards
+        """
+        permutations = np.tile(np.arange(self.size), (len(self.moves), 1))
+        for m, move in enumerate(self.moves):
+            for _, old, new in move[3]:
+                permutations[m, new] = old
+        return permutations
+
+    def build_pattern_groups(self):
+        """
+        Returns the groups of tiles of the pattern databases - the tiles of every row, split into as few pieces of
+        nearly equal size as keep a table of (rows*cols)^<tiles in the piece> entries within PDB_MAX_ENTRIES
+        """
+        chunk = 1
+        while chunk < self.cols and self.size ** (chunk + 1) <= PDB_MAX_ENTRIES:
+            chunk += 1
+        pieces = -(-self.cols // chunk)
+        groups = []
+        for i in range(self.rows):
+            row = list(range(i * self.cols + 1, (i + 1) * self.cols + 1))
+            groups += [tuple(row[p * self.cols // pieces:(p + 1) * self.cols // pieces]) for p in range(pieces)]
+        return tuple(groups)
+
+    def build_pdb_weights(self):
+        """
+        Returns a table indexed by [tile - 1] with a (group number, weight) pair for the group the tile belongs to
+        """
+        weights = [None] * self.size
+        for group, tiles in enumerate(self.pattern_groups):
+            for slot, tile in enumerate(tiles):
+                weights[tile - 1] = (group, self.size ** slot)
+        return weights
+
+    def pattern_database_path(self, tiles):
+        return os.path.join(PDB_DIR, "pdb_%dx%d_%s.npy" % (self.rows, self.cols, "-".join(str(t) for t in tiles)))
+
+    def pattern_databases(self):
+        """
+        Returns the pattern databases of pattern_groups, memory mapped from PDB_DIR. Missing tables are built and saved
+        first, which only happens once per machine and board size
+        """
+        if self.tables is None:
+            tables = []
+            for tiles in self.pattern_groups:
+                path = self.pattern_database_path(tiles)
+                if not os.path.exists(path):
+                    os.makedirs(PDB_DIR, exist_ok=True)
+                    temporary = path + ".%d.tmp" % os.getpid()
+                    with open(temporary, "wb") as file:
+                        np.save(file, build_pattern_database(self, tiles))
+                    os.replace(temporary, path)
+                tables.append(memoryview(np.load(path, mmap_mode="r")))
+            self.tables = tables
+        return self.tables
+
+    def board_keys(self, boards):
+        """
+        Packs an (N, rows*cols) array of boards (tiles numbered from 0) into an array of N sortable keys, bits bits per
+        tile spread over as many 64 bit words as needed
+        """
+        words = np.zeros((len(boards), len(self.key_dtype.names)), dtype=np.uint64)
+        for position in range(self.size):
+            word, slot = divmod(position, self.tiles_per_word)
+            words[:, word] |= boards[:, position].astype(np.uint64) << np.uint64(self.bits * slot)
+        return words.view(self.key_dtype).ravel()
+
+
+@functools.lru_cache(maxsize=None)
+def get_puzzle(rows, cols):
+    """
+    Returns the Puzzle of the given size, built on the first call and reused after that
+    """
+    return Puzzle(rows, cols)
+
+
+DEFAULT_PUZZLE = get_puzzle(ROWS, COLS)
+# tables of the default 4x5 board
+BITS = DEFAULT_PUZZLE.bits
+TILE_MASK = DEFAULT_PUZZLE.tile_mask
+MOVES = DEFAULT_PUZZLE.moves
+UNDO_MOVES = DEFAULT_PUZZLE.undo_moves
+MOVE_NAMES = DEFAULT_PUZZLE.move_names
+GOAL_BOARD = DEFAULT_PUZZLE.goal
+MANHATTAN_TERMS = DEFAULT_PUZZLE.manhattan_terms
+PATTERN_GROUPS = DEFAULT_PUZZLE.pattern_groups
+PERMUTATIONS = DEFAULT_PUZZLE.permutations
+
+
+def pack_board(tiles, puzzle=DEFAULT_PUZZLE):
+    """
+    Packs a flat sequence of tiles (numbers 1 - ROWS*COLS, row by row) into an integer
+    """
+    return puzzle.pack(tiles)
+
+
+def unpack_board(packed, puzzle=DEFAULT_PUZZLE):
     """
-    1. This method is called when the parent or previous node of a successor is to be updated. If this function is called,
-    it means that a particular state was reached again, this time with better cost
-    2.For every state, 'move' is the move which took place on the board to reach this state. If we check all the successors of
-    this reached state, one of them would be the previous state, since this is a board configuration
+    Returns the flat tuple of tiles stored in a packed board
     """
-    for i in successors(state.cameFrom):
-        if i.boardConfiguration == state.boardConfiguration:
-            return i.move
+    return puzzle.unpack(packed)
+
+
+def apply_move(board, move):
+    """
+    Returns the packed board obtained by making the given move (an entry of Puzzle.moves) on a packed board
+    """
+    new_board = board & move[1]
+    for mask, left, right in move[2]:
+        new_board |= ((board & mask) << left) >> right
+    return new_board
+
+
+# Pattern databases - for a group of tiles, the exact number of moves needed to bring just those tiles to their goal
+# positions, with every other tile treated as a blank. Each table is indexed by the positions of the group's tiles,
+# sum(position[tile] * (rows*cols)^slot), and holds the distance as a byte (255 for impossible position combinations).
+# Every move moves tiles of several groups at once, so the tables are combined with max rather than added
+
+
+def build_pattern_database(puzzle, tiles):
+    """
+    Returns the pattern database of a group of tiles as a uint8 numpy array, filled in by a breadth first search
+    backwards from the goal positions of the tiles. Since moves only go one way, the predecessors of a set of positions
+    are found by undoing every move
+    """
+    size = puzzle.size
+    weights = size ** np.arange(len(tiles), dtype=np.int64)
+    undo = np.empty((len(puzzle.moves), size), dtype=np.uint8)   # position of a tile before the move, by position after
+    for m, move in enumerate(puzzle.moves):
+        undo[m] = np.arange(size)
+        for _, old, new in move[3]:
+            undo[m][new] = old
+
+    table = np.full(size ** len(tiles), UNREACHED, dtype=np.uint8)
+    frontier = np.array([[tile - 1 for tile in tiles]], dtype=np.uint8)
+    table[frontier @ weights] = 0
+    depth = 0
+    while len(frontier):
+        depth += 1
+        layers = []
+        for m in range(len(puzzle.moves)):
+            previous = undo[m][frontier]
+            indexes = previous @ weights
+            new = table[indexes] == UNREACHED
+            indexes, first = np.unique(indexes[new], return_index=True)
+            table[indexes] = depth
+            layers.append(previous[new][first])
+        frontier = np.concatenate(layers)
+    return table
+
+
+def load_pattern_databases(puzzle=DEFAULT_PUZZLE):
+    """
+    Returns the memory mapped pattern databases of a board size, see Puzzle.pattern_databases
+    """
+    return puzzle.pattern_databases()
 
 
 def reconstructpath(current):
@@ -50,88 +359,81 @@ class State:
     cost plus the value of the heuristic function
     """
 
-    def __init__(self, board, cost, parent, move):
+    def __init__(self, board, cost, parent, move, manhattan=None, puzzle=DEFAULT_PUZZLE):
         self.cost = cost
         self.cameFrom = parent
-        self.boardConfiguration = board
+        self.board = board                  # packed board, see pack_board
         self.move = move
+        self.puzzle = puzzle                # tables for the size of the board
+        # sum of the h1 distance terms, successors pass it in after updating the parent's sum with the tiles moved
+        self.manhattan = puzzle.manhattan_sum(board) if manhattan is None else manhattan
         self.fscore = 0
 
-    def get_fscore(self):
+    @property
+    def boardConfiguration(self):
+        """
+        The board as a list of rows
+        """
+        tiles = self.puzzle.unpack(self.board)
+        cols = self.puzzle.cols
+        return [list(tiles[i * cols:(i + 1) * cols]) for i in range(self.puzzle.rows)]
+
+    def get_fscore(self, heuristic=None):
         """
-        Returns a value which is the sum of the cost function adn heuristic function
+        Returns a value which is the sum of the cost function adn heuristic function. The value is also cached in fscore.
+        heuristic is one of the heuristic methods of this class, h1 by default
         """
-        self.fscore = self.cost + self.h1()
+        self.fscore = self.cost + (self.h1() if heuristic is None else heuristic(self))
         return self.fscore
 
     def h(self):
         """
         Heuristic Function 1 - Returns a value equal to the number of misplaced numbers on the board/ no. of rows plus columns
         """
+        board = self.boardConfiguration
         h = 0
-        for i in range(len(self.boardConfiguration)):
-            for j in range(len(self.boardConfiguration[0])):
-                if self.boardConfiguration[i][j] != i * ROWS + (j + 1):
+        for i in range(len(board)):
+            for j in range(len(board[0])):
+                if board[i][j] != i * len(board[0]) + (j + 1):
                     h += 1
-        return h / (len(self.boardConfiguration) + len(self.boardConfiguration[0]))
+        return h / (len(board) + len(board[0]))
 
     def h1(self):
         """
         Heuristic Function 2 - Sees the distance of each index on the board from goal and then returns an aggregate
-        of minimum of the maximum column moves plus maximum row moves.
+        of minimum of the maximum column moves plus maximum row moves. The sum of the distances is kept up to date in
+        manhattan, so this is a single division
         """
-        board = self.boardConfiguration
-        board = np.array(board)
-
-        indexes = [None] * len(board) * len(board[0])
-        for i in range(len(board)):
-            for j in range(len(board[0])):
-                indexes[board[i][j] - 1] = (i, j)
-        moves = [[None for _ in range(len(board[0]))] for _ in range(len(board))]
-        sum_moves = 0
-        count = 0                    # to traverse the indexes list which contains the indexes of all the numbers from 1-20
-        for i in range(len(board)):
-            for j in range(len(board[0])):
-                moves[i][j] = abs(indexes[count][0] - i + indexes[count][1] - j)
-                sum_moves += moves[i][j]
-                count += 1
-        return sum_moves / ((len(board) + len(board[0]))/2)
+        return self.manhattan / ((self.puzzle.rows + self.puzzle.cols) / 2)
 
     def h2(self):
         """
-        Heuristic function 3
+        Heuristic function 3 - counts the rows and columns holding the same set of numbers as in the goal
         """
+        puzzle = self.puzzle
+        board = self.boardConfiguration
         moves = 0
-        board = np.array(self.boardConfiguration)
-        L1 = [i for i in range(1, len(board[0]) + 1)]
-        R2 = [i + 5 for i in range(1, len(board[0]) + 1)]
-        L3 = [i + 10 for i in range(1, len(board[0]) + 1)]
-        R4 = [i + 15 for i in range(1, len(board[0]) + 1)]
-        U1 = [(i * 5) + 1 for i in range(len(board))]
-        D2 = [(i * 5) + 2 for i in range(len(board))]
-        U3 = [(i * 5) + 3 for i in range(len(board))]
-        D4 = [(i * 5) + 4 for i in range(len(board))]
-        U5 = [(i * 5) + 5 for i in range(len(board))]
-        L1_Actual = board[0, :]
-        R2_Actual = board[1, :]
-        L3_Actual = board[2, :]
-        R4_Actual = board[3, :]
-        U1_Actual = board[:, 0]
-        D2_Actual = board[:, 1]
-        U3_Actual = board[:, 2]
-        D4_Actual = board[:, 3]
-        U5_Actual = board[:, 4]
-        moves += 1 if set(L1) == set(L1_Actual) else 0
-        moves += 1 if set(R2) == set(R2_Actual) else 0
-        moves += 1 if set(L3) == set(L3_Actual) else 0
-        moves += 1 if set(R4) == set(R4_Actual) else 0
-        moves += 1 if set(U1) == set(U1_Actual) else 0
-        moves += 1 if set(D2) == set(D2_Actual) else 0
-        moves += 1 if set(U3) == set(U3_Actual) else 0
-        moves += 1 if set(D4) == set(D4_Actual) else 0
-        moves += 1 if set(U5) == set(U5_Actual) else 0
+        for i in range(puzzle.rows):
+            moves += 1 if set(board[i]) == puzzle.row_tiles[i] else 0
+        for j in range(puzzle.cols):
+            moves += 1 if set(row[j] for row in board) == puzzle.col_tiles[j] else 0
         return moves
 
+    def h3(self):
+        """
+        Heuristic function 4 - The largest number of moves needed by any group of tiles in Puzzle.pattern_groups to
+        reach its goal positions, looked up in the pattern databases. This never overestimates, since rotations wrap
+        around the board exactly as they do in the search that built the tables
+        """
+        puzzle = self.puzzle
+        tables = puzzle.pattern_databases()
+        indexes = [0] * len(tables)
+        board = self.board
+        for position in range(puzzle.size):
+            group, weight = puzzle.pdb_weights[(board >> (puzzle.bits * position)) & puzzle.tile_mask]
+            indexes[group] += weight * position
+        return max(table[index] for table, index in zip(tables, indexes))
+
 
 def printable_board(board):
     return [('%3d ') * COLS % board[j:(j + COLS)] for j in range(0, ROWS * COLS, COLS)]
@@ -142,123 +444,609 @@ def successors(state):
     """
     Returns <no. of rows + no. of columns> successors which are successors at one move difference from the passed state
     """
+    board = state.board
+    puzzle = state.puzzle
+    manhattan_terms = puzzle.manhattan_terms
+    tile_mask = puzzle.tile_mask
     successor_states = []
-    successor_states.extend([i for i in get_row_moves(state)])
-    successor_states.extend([i for i in get_col_moves(state)])
+    for move in puzzle.moves:
+        manhattan = state.manhattan         # only the tiles of the rotated row/column change their distance
+        for shift, old, new in move[3]:
+            terms = manhattan_terms[(board >> shift) & tile_mask]
+            manhattan += terms[new] - terms[old]
+        successor_states.append(State(apply_move(board, move), math.inf, None, move[0], manhattan, puzzle))
     return successor_states
 
 
-def get_row_moves(state):
+def is_goal(board, puzzle=DEFAULT_PUZZLE):
     """
-    Returns <no. of rows> successors obtained by making only left or right shifts to the given state
+    Check if the packed board is in canonical/sequential order of numbers. Returns a boolean value.
     """
-    successor_states = []
-    for i in range(len(state.boardConfiguration)):
-        newstate = state.boardConfiguration.copy()
-        newrow = state.boardConfiguration[i].copy()
-        if i == 1 or i == 3:
-            newrow.insert(0, newrow.pop())
-            move = str('R' + str(i + 1))
-        else:
-            newrow.append(newrow.pop(0))
-            move = str('L' + str(i + 1))
-        newstate[i] = newrow
-        successor_states.append(State(newstate, math.inf, None, move))
+    return board == puzzle.goal
 
-    return successor_states
 
+class SearchStats:
+    """
+    Counters filled in by the search engines when solve is called with return_stats=True. expanded counts the boards
+    whose successors were generated, generated the successors made, duplicates the successors dropped because their
+    board was already reached as cheaply (or, for idastar, found in the transposition table), peak_fringe the largest
+    fringe (largest layer for bidirectional and numpy, deepest path for idastar) and iterations the number of bounds
+    tried by idastar and numpy. heuristic_seconds and successor_seconds are the time spent computing heuristics and
+    successors, and phases the wall clock time of every phase of solve
+    """
 
-def get_col_moves(state):
+    def __init__(self):
+        self.expanded = 0
+        self.generated = 0
+        self.duplicates = 0
+        self.peak_fringe = 0
+        self.iterations = 0
+        self.heuristic_seconds = 0.0
+        self.successor_seconds = 0.0
+        self.phases = {}
+
+    def timed(self, function, attribute):
+        """
+        Returns function wrapped so that the time spent in it is added to the given attribute
+        """
+        def wrapper(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                setattr(self, attribute, getattr(self, attribute) + time.perf_counter() - start)
+        return wrapper
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def as_dict(self):
+        return {"expanded": self.expanded, "generated": self.generated, "duplicates": self.duplicates,
+                "peak_fringe": self.peak_fringe, "iterations": self.iterations,
+                "heuristic_seconds": self.heuristic_seconds, "successor_seconds": self.successor_seconds,
+                "phases": dict(self.phases)}
+
+
+HEURISTICS = {"h": State.h, "h1": State.h1, "h2": State.h2, "h3": State.h3}
+ENGINES = ("astar", "idastar", "bidirectional", "numpy")     # see solve
+TRANSPOSITION_TABLE_SIZE = 1 << 16      # boards remembered by idastar, 0 turns the table off
+
+
+def idastar(state, heuristic, table_size=None, stats=None):
     """
-    Returns <no. of columns> successors obtained by making only left or right shifts to the given state
+    Iterative deepening A* - repeated depth first searches, each one cut off at states whose fscore is over a bound,
+    which starts at the fscore of the initial state and grows to the smallest fscore cut off by the previous search.
+    Only the states on the current path are kept, so memory stays flat however deep the solution is. A transposition
+    table of at most table_size boards, least recently used dropped first, skips boards already searched during
+    the current iteration with the same or a smaller cost; table_size None takes TRANSPOSITION_TABLE_SIZE as it is
+    when the search starts. Returns the list of moves, or None if there is no solution. stats is an optional
+    SearchStats to fill in
     """
-    successor_states = []
-    array = np.array(state.boardConfiguration)
-    array = np.transpose(array)
-    for i in range(len(array)):
-        newstate = array.tolist().copy()
-        newrow = newstate[i].copy()
-        if i == 1 or i == 3:
-            newrow.insert(0, newrow.pop())
-            move = str('D' + str(i + 1))
+    if table_size is None:
+        table_size = TRANSPOSITION_TABLE_SIZE
+    expand = successors
+    if stats is not None:
+        heuristic = stats.timed(heuristic, "heuristic_seconds")
+        expand = stats.timed(successors, "successor_seconds")
+    puzzle = state.puzzle
+    followers, repeats = puzzle.followers, puzzle.repeats
+    table = collections.OrderedDict()       # packed board -> smallest cost it was searched from in this iteration
+    path = []                               # moves made to reach the state being searched
+    all_moves = tuple(range(len(puzzle.moves)))
+
+    def search(current, bound, last, run):
+        fscore = current.get_fscore(heuristic)
+        if fscore > bound:
+            return fscore
+        if is_goal(current.board, puzzle):
+            return True
+        if table_size:
+            seen = table.get(current.board)
+            if seen is not None and seen <= current.cost:
+                if stats is not None:
+                    stats.duplicates += 1
+                return math.inf
+            table[current.board] = current.cost
+            table.move_to_end(current.board)
+            if len(table) > table_size:
+                table.popitem(last=False)
+        smallest = math.inf
+        children = expand(current)
+        if stats is not None:
+            stats.expanded += 1
+            stats.generated += len(children)
+            stats.peak_fringe = max(stats.peak_fringe, current.cost)
+        for m in (all_moves if last is None else followers[last]):
+            repeat = run + 1 if m == last else 1
+            if repeat >= repeats[m]:
+                continue
+            child = children[m]
+            child.cost = current.cost + 1
+            path.append(child.move)
+            result = search(child, bound, m, repeat)
+            if result is True:
+                return True
+            path.pop()
+            smallest = min(smallest, result)
+        return smallest
+
+    bound = state.get_fscore(heuristic)
+    while bound != math.inf:
+        table.clear()
+        if stats is not None:
+            stats.iterations += 1
+        result = search(state, bound, None, 0)
+        if result is True:
+            return path
+        bound = result
+    return None
+
+
+def bidirectional(state, stats=None):
+    """
+    Bidirectional breadth first search - one search goes forward from the initial board and the other backwards from
+    the goal, undoing moves (see Puzzle.undo_moves), always growing the side with the smaller frontier by one whole layer.
+    When a new board is already known to the other side, the two halves are joined. Returns the shortest list of
+    moves, or None if there is no solution. stats is an optional SearchStats to fill in
+    """
+    puzzle = state.puzzle
+    forward = {state.board: None}           # board -> (previous board, move index) towards the initial board
+    backward = {puzzle.goal: None}          # board -> (next board, move index) towards the goal
+    forward_frontier = [state.board]
+    backward_frontier = [puzzle.goal]
+    meeting = state.board if state.board in backward else None
+
+    while meeting is None and forward_frontier and backward_frontier:
+        growing_forward = len(forward_frontier) <= len(backward_frontier)
+        if growing_forward:
+            frontier, seen, other, moves = forward_frontier, forward, backward, puzzle.moves
         else:
-            newrow.append(newrow.pop(0))
-            move = str('U' + str(i + 1))
-        newstate[i] = newrow
-        successor_states.append(State(np.transpose(np.array(newstate)).tolist(), math.inf, None, move))
-    return successor_states
+            frontier, seen, other, moves = backward_frontier, backward, forward, puzzle.undo_moves
+        layer = []
+        best = math.inf
+        start = time.perf_counter()
+        for board in frontier:
+            for m, move in enumerate(moves):
+                new_board = apply_move(board, move)
+                if new_board in seen:
+                    if stats is not None:
+                        stats.duplicates += 1
+                    continue
+                seen[new_board] = (board, m)
+                layer.append(new_board)
+                if new_board in other:
+                    # the whole layer is checked, the join closest to the far end gives the shortest path
+                    length = len(reconstruct_half(other, new_board, puzzle))
+                    if length < best:
+                        best, meeting = length, new_board
+        if growing_forward:
+            forward_frontier = layer
+        else:
+            backward_frontier = layer
+        if stats is not None:
+            stats.successor_seconds += time.perf_counter() - start
+            stats.expanded += len(frontier)
+            stats.generated += len(frontier) * len(moves)
+            stats.peak_fringe = max(stats.peak_fringe, len(layer))
+
+    if meeting is None:
+        return None
+    return reconstruct_half(forward, meeting, puzzle)[::-1] + reconstruct_half(backward, meeting, puzzle)
+
+
+def reconstruct_half(parents, board, puzzle):
+    """
+    Returns the names of the moves stored in one side of the bidirectional search, from the given board to the end of
+    that side (reversed for the forward side)
+    """
+    path = []
+    while parents[board] is not None:
+        board, m = parents[board]
+        path.append(puzzle.moves[m][0])
+    return path
 
 
-def is_goal(state):
+def manhattan_vector(puzzle, boards):
     """
-    Check if the board is in canonical/sequential order of numbers. Returns a boolean value.
+    h1 for an (N, rows*cols) array of boards
     """
-    for i in range(len(state)):
-        for j in range(len(state[0])):
-            if state[i][j] != i * COLS + (j + 1):
-                return False
-    return True
+    terms = np.array(puzzle.manhattan_terms)
+    return terms[boards, np.arange(puzzle.size)].sum(axis=1) / ((puzzle.rows + puzzle.cols) / 2)
 
 
-def solve(initial_board):
+def pattern_database_vector(puzzle, boards):
+    """
+    h3 for an (N, rows*cols) array of boards
+    """
+    positions = np.argsort(boards, axis=1)  # position of every tile
+    best = np.zeros(len(boards), dtype=np.uint8)
+    for tiles, table in zip(puzzle.pattern_groups, puzzle.pattern_databases()):
+        weights = puzzle.size ** np.arange(len(tiles), dtype=np.int64)
+        indexes = positions[:, [tile - 1 for tile in tiles]] @ weights
+        best = np.maximum(best, np.frombuffer(table, dtype=np.uint8)[indexes])
+    return best
+
+
+VECTOR_HEURISTICS = {"h1": manhattan_vector, "h3": pattern_database_vector}
+
+
+def layered_search(board, heuristic, stats=None, puzzle=DEFAULT_PUZZLE):
+    """
+    Level synchronous search on numpy arrays - every layer of boards is stored as an (N, rows*cols) uint8 array and all
+    the moves are made on the whole layer at once with Puzzle.permutations. Repeated boards are dropped with np.unique
+    and np.isin on the packed keys of Puzzle.board_keys. With a heuristic of VECTOR_HEURISTICS, evaluated on the whole
+    layer, boards whose fscore is over a bound are dropped, and the search is repeated with the bound raised to the
+    smallest fscore dropped until the goal is found (h3 gives shortest solutions). The other HEURISTICS give a plain
+    breadth first search, whose layers grow by the number of moves, so only shallow boards fit in memory; names that
+    aren't in HEURISTICS raise an exception. Returns the list of moves, or None if there is no solution. stats is an
+    optional SearchStats to fill in
+    """
+    if heuristic not in HEURISTICS:
+        raise (Exception("Error: unknown heuristic %s, expected one of %s" % (heuristic, ", ".join(HEURISTICS))))
+    vector = VECTOR_HEURISTICS.get(heuristic)
+    if stats is not None and vector is not None:
+        vector = stats.timed(vector, "heuristic_seconds")
+    start = np.array([puzzle.unpack(board)], dtype=np.uint8) - 1
+    goal = puzzle.board_keys(np.arange(puzzle.size, dtype=np.uint8)[None])[0]
+    bound = vector(puzzle, start)[0] if vector is not None else math.inf
+
+    while True:
+        if stats is not None:
+            stats.iterations += 1
+        frontier = start
+        seen = puzzle.board_keys(start)     # sorted keys of every board reached
+        layers = []                         # for every layer, (index of the parent in the layer before, move index)
+        pruned = math.inf                   # smallest fscore dropped in this iteration
+        while len(frontier):
+            started = time.perf_counter()
+            children = frontier[:, puzzle.permutations].reshape(-1, puzzle.size)
+            keys, first = np.unique(puzzle.board_keys(children), return_index=True)
+            new = ~np.isin(keys, seen)
+            keys, first = keys[new], first[new]
+            if stats is not None:
+                stats.successor_seconds += time.perf_counter() - started
+                stats.expanded += len(frontier)
+                stats.generated += len(children)
+                stats.duplicates += len(children) - len(first)
+            children = children[first]
+            parents, moves = np.divmod(first, len(puzzle.moves))
+            if vector is not None:
+                fscore = len(layers) + 1 + vector(puzzle, children)
+                keep = fscore <= bound
+                if not keep.all():
+                    pruned = min(pruned, fscore[~keep].min())
+                keys, children, parents, moves = keys[keep], children[keep], parents[keep], moves[keep]
+            layers.append((parents, moves))
+            found = np.nonzero(keys == goal)[0]
+            if len(found):
+                path = []
+                index = found[0]
+                for parents, moves in reversed(layers):
+                    path.append(puzzle.moves[moves[index]][0])
+                    index = parents[index]
+                return path[::-1]
+            seen = np.union1d(seen, keys)
+            frontier = children
+            if stats is not None:
+                stats.peak_fringe = max(stats.peak_fringe, len(frontier))
+        if pruned == math.inf:
+            return None
+        bound = pruned
+
+
+SOLUTION_CACHE_SIZE = 1 << 16          # solutions kept in memory by SolutionCache
+
+
+def is_optimal(heuristic, engine):
+    """
+    Whether an engine with a heuristic always finds shortest solutions - bidirectional whatever the heuristic, the
+    others with h3, the only heuristic which never overestimates
+    """
+    return engine == "bidirectional" or heuristic == "h3"
+
+
+class SolutionCache:
+    """
+    Remembers solved boards, packed board -> list of moves. The most recently used solutions are kept in memory, the
+    rest in an optional dbm file at path, so solutions survive between runs. When a solution is stored, every board on
+    its way to the goal is stored too with the rest of the moves, so a later board landing on one of them is answered
+    straight away. Boards of different sizes are kept apart by prefixing the keys with the size.
+
+    Every solution is marked optimal or not, see is_optimal: the rest of a shortest solution is a shortest solution
+    too, but the rest of any other solution may not be, so a search asking for shortest solutions only gets the ones
+    marked optimal. On disk the moves of optimal solutions are prefixed with "!"
+    """
+
+    def __init__(self, path=None, size=SOLUTION_CACHE_SIZE):
+        self.memory = collections.OrderedDict()
+        self.size = size
+        self.disk = dbm.open(path, "c") if path is not None else None
+
+    def lookup(self, key):
+        """
+        Returns the (moves, optimal) entry of a key, or None
+        """
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            return entry
+        if self.disk is not None:
+            stored = self.disk.get(key)
+            if stored is not None:
+                stored = stored.decode()
+                entry = (stored.lstrip("!").split(), stored.startswith("!"))
+                self.remember(key, entry)
+        return entry
+
+    def get(self, board, puzzle=DEFAULT_PUZZLE, optimal=False):
+        """
+        Returns the stored moves for a packed board, or None. With optimal, only a solution marked optimal is returned
+        """
+        entry = self.lookup("%dx%d:%x" % (puzzle.rows, puzzle.cols, board))
+        if entry is None or (optimal and not entry[1]):
+            return None
+        return entry[0]
+
+    def put(self, board, moves, puzzle=DEFAULT_PUZZLE, optimal=False):
+        """
+        Stores the moves solving a packed board, and the remaining moves for every board reached along the way, marked
+        optimal or not. A board which already has a solution at least as short keeps it, unless only the new one is
+        optimal
+        """
+        for i in range(len(moves) + 1):
+            key = "%dx%d:%x" % (puzzle.rows, puzzle.cols, board)
+            known = self.lookup(key)
+            if known is None or len(known[0]) > len(moves) - i or (optimal and not known[1]):
+                self.remember(key, (moves[i:], optimal))
+                if self.disk is not None:
+                    self.disk[key] = ("!" if optimal else "") + " ".join(moves[i:])
+            if i < len(moves):
+                board = apply_move(board, puzzle.move_names[moves[i]])
+
+    def remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
+
+
+def solve(initial_board, heuristic="h1", engine="astar", cache=None, return_stats=False, shape=None,
+          table_size=None):
     """
     1. This function should return the solution as instructed in assignment, consisting of a list of moves like ["R2","D2","U1"].
-    2. Do not add any extra parameters to the solve() function, or it will break our grading and testing code.
-       For testing we will call this function with single argument(initial_board) and it should return 
-       the solution.
+    2. The grading and testing code calls solve(initial_board) with the board alone, so that call must keep working and
+       return the solution - every parameter after initial_board is optional and defaults to the assignment setup.
     3. Please do not use any global variables, as it may cause the testing code to fail.
     4. You can assume that all test cases will be solvable.
     5. The current code just returns a dummy solution.
+    6. heuristic names the State heuristic method used to order the fringe (see HEURISTICS), other names raise an
+       exception. "h3", the pattern database, never overestimates and gives shortest solutions; "h1" is the default.
+    7. engine is "astar" (default), "idastar", see idastar - uses almost no memory on deep boards, or "bidirectional",
+       see bidirectional - shortest solutions without a heuristic, or "numpy", see layered_search - whole layers of
+       boards searched at once on numpy arrays. Other names raise an exception.
+    8. cache is an optional SolutionCache, looked up before searching and filled in with the solution found. A search
+       giving shortest solutions (see is_optimal) only takes cached solutions which are shortest too.
+    9. With return_stats=True, a (moves, SearchStats) pair is returned instead of just the moves.
+    10. shape is (rows, cols) for boards of another size than ROWS x COLS. The tables for each size are built on the
+        first board of that size, see get_puzzle.
+    11. table_size is the number of boards in the transposition table of idastar, 0 for none and None for
+        TRANSPOSITION_TABLE_SIZE.
+    """
+    stats = SearchStats()
+    moves = None
+    with stats.phase("setup"):
+        puzzle = get_puzzle(*shape) if shape is not None else DEFAULT_PUZZLE
+        if len(initial_board) != puzzle.size:
+            raise (Exception("Error: expected a board of %d numbers" % puzzle.size))
+        if sorted(initial_board) != list(range(1, puzzle.size + 1)):
+            raise (Exception("Error: the board must hold each number from 1 to %d once" % puzzle.size))
+        if engine not in ENGINES:
+            raise (Exception("Error: unknown engine %s, expected one of %s" % (engine, ", ".join(ENGINES))))
+        if heuristic not in HEURISTICS:
+            raise (Exception("Error: unknown heuristic %s, expected one of %s" % (heuristic, ", ".join(HEURISTICS))))
+        if not puzzle.solvable(initial_board):
+            raise (Exception("Error: this board can't be solved on a %dx%d puzzle" % (puzzle.rows, puzzle.cols)))
+        if heuristic == "h3":
+            puzzle.pattern_databases()
+    board = puzzle.pack(initial_board)      # used to get board in a packed integer form
+    if cache is not None:
+        with stats.phase("cache"):
+            moves = cache.get(board, puzzle, is_optimal(heuristic, engine))
+            if moves is not None:
+                moves = list(moves)
+    if moves is None:
+        with stats.phase("search"):
+            moves = search(board, heuristic, engine, stats if return_stats else None, puzzle, table_size)
+        if cache is not None and moves is not None:
+            with stats.phase("cache"):
+                cache.put(board, list(moves), puzzle, is_optimal(heuristic, engine))
+    return (moves, stats) if return_stats else moves
+
+
+def search(board, heuristic, engine, stats=None, puzzle=DEFAULT_PUZZLE, table_size=None):
+    """
+    Runs the search engine named by engine on a packed board, see solve. stats is an optional SearchStats to fill in,
+    table_size the size of the idastar transposition table
     """
-    board = [[0] * COLS for _ in range(ROWS)]  # used to get board in a 2d list form
-    a = iter(list(initial_board))
-    for i in range(ROWS):
-        for j in range(COLS):
-            board[i][j] = next(a)
-    state = State(board, 0, None, '')       # creating a state class instance with board as board configuration,
-    # cost as 0, previous as None, and move as blank
-    if is_goal(state.boardConfiguration):   # checking if initial state itself is the goal
+    state = State(board, 0, None, '', puzzle=puzzle)    # creating a state class instance with board as board
+    # configuration, cost as 0, previous as None, and move as blank
+    if is_goal(state.board, puzzle):   # checking if initial state itself is the goal
         return state.move
-    fringe = [state]                        # fringe variable to keep a list of all nodes considered so far
-    move_num = 0
-    visited = []
+    if engine == "numpy":
+        return layered_search(board, heuristic, stats, puzzle)
+    if engine == "bidirectional":
+        return bidirectional(state, stats=stats)
+    heuristic = HEURISTICS[heuristic]
+    if engine == "idastar":
+        return idastar(state, heuristic, table_size, stats=stats)
+    expand = successors
+    if stats is not None:
+        heuristic = stats.timed(heuristic, "heuristic_seconds")
+        expand = stats.timed(successors, "successor_seconds")
+    counter = itertools.count()             # tie breaker so that states with equal fscore pop in insertion order
+    fringe = [(state.get_fscore(heuristic), next(counter), state)]   # binary heap of (fscore, order, state)
+    best_cost = {state.board: 0}            # packed board -> cheapest cost found so far
+    closed = set()                          # packed boards which have already been expanded
 
     while fringe:
-        current = fringe.pop(fringe.index(min(fringe, key=lambda t: t.get_fscore()))) # assign current as the item in
-        # fringe with minimum fscore
-        visited.append(current)
-        # move_num += 1                                  # used to see the no. of moves states considered so far
-        # print(move_num, end=' ')
-        # print(printable_board(tuple(np.ndarray.flatten(np.array(current.boardConfiguration)))))
-        for i in successors(current):
-            present = False
-            if is_goal(i.boardConfiguration):           # if goal is reached, update previous state and call path
+        current = heapq.heappop(fringe)[2]  # assign current as the item in fringe with minimum fscore
+        if current.board in closed or current.cost > best_cost[current.board]:
+            continue                        # lazy deletion - a cheaper copy of this board was pushed after this one
+        closed.add(current.board)
+        children = expand(current)
+        if stats is not None:
+            stats.expanded += 1
+            stats.generated += len(children)
+            stats.peak_fringe = max(stats.peak_fringe, len(fringe))
+        for i in children:
+            if is_goal(i.board, puzzle):        # if goal is reached, update previous state and call path
                 # reconstruction method
                 i.cameFrom = current
                 return reconstructpath(i)
 
-            for item in fringe:                         # check items in fringe, if an exact boardconfiguration in
-                # fringe already exists, then this state is an existing state and cost and previous state
-                # needs to be updated depending on the value of the cost
-                if i.boardConfiguration == item.boardConfiguration:
-                    present = True
-                    existingState = item
-            if present:
-                if existingState.cost > current.cost + 1:
-                    existingState.cameFrom = current
-                    existingState.move = updatemove(existingState)
-                    existingState.cost = current.cost + 1
-            # since this state hasnt been reached yet, we append it to the fringe
-            else:
-                # newstate = State(i.boardConfiguration, i.cost + h(i.boardConfiguration),current,i.move)
-                i.cameFrom = current
-                i.cost = current.cost + 1
-                fringe.append(i)
+            # if this board was already reached with the same or a smaller cost there is nothing to update, otherwise
+            # the cost and previous state are recorded and the state is (re)added to the fringe. The stale copy
+            # left in the heap is skipped when it is popped
+            if best_cost.get(i.board, math.inf) <= current.cost + 1:
+                if stats is not None:
+                    stats.duplicates += 1
+                continue
+            i.cameFrom = current
+            i.cost = current.cost + 1
+            best_cost[i.board] = i.cost
+            closed.discard(i.board)
+            heapq.heappush(fringe, (i.get_fscore(heuristic), next(counter), i))
 
     return reconstructpath(current)  # This line is unreachable since it will only reach here if fringe is empty,
     # having not reached the goal
 
 
+class SolveTimeout(Exception):
+    """
+    Raised inside a batch worker when a board takes longer than the per-board timeout
+    """
+
+
+def raise_timeout(signum, frame):
+    raise SolveTimeout()
+
+
+def init_batch_worker(heuristic, shape):
+    """
+    Runs once in every worker process of solve_batch. The pattern databases are memory mapped, so all the workers share
+    the same pages of the files
+    """
+    signal.signal(signal.SIGALRM, raise_timeout)
+    if heuristic == "h3":
+        get_puzzle(*shape).pattern_databases()
+
+
+def solve_one(task):
+    """
+    Solves one board of a batch in a worker process, stopping it with SIGALRM after the timeout. Returns a dictionary
+    with the position of the board in the input, the board, "status" (solved, timeout or error), the moves, the time
+    taken in seconds and, if asked for, the SearchStats of the search as a dictionary
+    """
+    index, board, heuristic, engine, timeout, with_stats, shape, table_size = task
+    result = {"index": index, "board": list(board), "status": "solved", "moves": None}
+    start = time.perf_counter()
+    try:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            if with_stats:
+                moves, stats = solve(board, heuristic, engine, return_stats=True, shape=shape, table_size=table_size)
+                result["stats"] = stats.as_dict()
+            else:
+                moves = solve(board, heuristic, engine, shape=shape, table_size=table_size)
+            result["moves"] = list(moves)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    except SolveTimeout:
+        result["status"] = "timeout"
+    except Exception as error:
+        result["status"] = "error"
+        result["error"] = repr(error)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def read_boards(file, size=ROWS * COLS):
+    """
+    Yields boards (tuples of <size> numbers) from a text file or stream. Numbers are read in order whatever the line
+    breaks, so a board can be on one line or on one line per row like board1
+    """
+    numbers = []
+    for line in file:
+        numbers += [int(i) for i in line.split()]
+        while len(numbers) >= size:
+            yield tuple(numbers[:size])
+            numbers = numbers[size:]
+    if numbers:
+        raise (Exception("Error: couldn't parse the last board, %d numbers left over" % len(numbers)))
+
+
+def solve_batch(boards, heuristic="h3", engine="idastar", workers=None, timeout=None, with_stats=False,
+                shape=(ROWS, COLS), table_size=None):
+    """
+    Solves many boards on a pool of worker processes (one per CPU by default) and yields the result of every board, see
+    solve_one, in the same order as the boards. timeout is the number of seconds allowed per board, None for no limit.
+    with_stats adds the search statistics to every result. shape is the (rows, cols) of the boards, table_size the size
+    of the idastar transposition table (None for TRANSPOSITION_TABLE_SIZE, 0 for none)
+    """
+    if heuristic == "h3":
+        get_puzzle(*shape).pattern_databases()  # build any missing table once here, not in every worker
+    tasks = ((index, tuple(board), heuristic, engine, timeout, with_stats, shape, table_size)
+             for index, board in enumerate(boards))
+    with multiprocessing.Pool(workers, init_batch_worker, (heuristic, shape)) as pool:
+        for result in pool.imap(solve_one, tasks):
+            yield result
+
+
+def parse_shape(text):
+    """
+    Parses a board size given as ROWSxCOLS on the command line
+    """
+    rows, cols = text.lower().split("x")
+    return int(rows), int(cols)
+
+
+def batch_main(arguments):
+    """
+    Command line of batch.py: python3 batch.py <boards file or - for stdin> [options]. Prints one JSON line per board, in
+    input order
+    """
+    parser = argparse.ArgumentParser(prog="batch.py")
+    parser.add_argument("boards", help="file with the boards to solve, - to read standard input")
+    parser.add_argument("--heuristic", default="h3", choices=sorted(HEURISTICS))
+    parser.add_argument("--engine", default="idastar", choices=ENGINES)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, one per CPU by default")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds allowed per board")
+    parser.add_argument("--stats", action="store_true", help="add the search statistics to every result")
+    parser.add_argument("--shape", type=parse_shape, default=(ROWS, COLS), help="board size as ROWSxCOLS, e.g. 3x3")
+    parser.add_argument("--table-size", type=int, default=None,
+                        help="boards in the idastar transposition table, 0 for none (default %d)"
+                             % TRANSPOSITION_TABLE_SIZE)
+    options = parser.parse_args(arguments)
+
+    file = sys.stdin if options.boards == "-" else open(options.boards, "r")
+    with file:
+        boards = read_boards(file, options.shape[0] * options.shape[1])
+        for result in solve_batch(boards, options.heuristic, options.engine, options.workers, options.timeout,
+                                  options.stats, options.shape, options.table_size):
+            print(json.dumps(result), flush=True)
+
+
 # Please don't modify anything below this line
 #
 if __name__ == "__main__":
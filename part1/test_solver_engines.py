@@ -0,0 +1,138 @@
+# test_solver_engines.py : checks for the optional search engines and heuristics of solver2021.py
+#
+# Run from part1: python3 -m pytest -v test_solver_engines.py
+
+import random
+import solver2021
+import pytest
+
+
+def scramble(depth, seed, puzzle=solver2021.DEFAULT_PUZZLE):
+    """Returns a board reached from the goal by undoing <depth> random moves, so it is solvable in at most depth moves"""
+    rng = random.Random(seed)
+    board = puzzle.goal
+    for _ in range(depth):
+        board = solver2021.apply_move(board, rng.choice(puzzle.undo_moves))
+    return puzzle.unpack(board)
+
+
+def replay(board, path, puzzle=solver2021.DEFAULT_PUZZLE):
+    """Returns the packed board obtained by making the moves of path on a flat board"""
+    board = puzzle.pack(board)
+    for name in path:
+        board = solver2021.apply_move(board, puzzle.move_names[name])
+    return board
+
+
+def bfs_length(board, puzzle=solver2021.DEFAULT_PUZZLE):
+    """Length of the shortest solution, found by breadth first search"""
+    frontier, seen, depth = [puzzle.pack(board)], set(), 0
+    while puzzle.goal not in frontier:
+        seen.update(frontier)
+        frontier = {solver2021.apply_move(b, move) for b in frontier for move in puzzle.moves} - seen
+        depth += 1
+    return depth
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("engine,heuristic", [("astar", "h3"), ("idastar", "h3"), ("bidirectional", "h1"),
+                                              ("numpy", "h3"), ("numpy", "h")])
+def test_optimal_engines_find_shortest_paths(engine, heuristic, seed):
+    board = scramble(6, seed)
+    path = solver2021.solve(board, heuristic=heuristic, engine=engine)
+    assert replay(board, path) == solver2021.GOAL_BOARD, "Path found was wrong!"
+    assert len(path) == bfs_length(board), "Not the shortest path!"
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(Exception, match="unknown engine"):
+        solver2021.solve(scramble(3, 0), heuristic="h3", engine="ida*")
+
+
+@pytest.mark.parametrize("engine", ["astar", "numpy"])
+def test_unknown_heuristic_is_rejected(engine):
+    with pytest.raises(Exception, match="unknown heuristic"):
+        solver2021.solve(scramble(3, 0), heuristic="H3", engine=engine)
+    with pytest.raises(Exception, match="unknown heuristic"):
+        solver2021.layered_search(solver2021.DEFAULT_PUZZLE.pack(scramble(3, 0)), "H3")
+
+
+def test_solve_batch_keeps_input_order():
+    boards = [scramble(depth, depth) for depth in (7, 1, 5, 3)]
+    results = list(solver2021.solve_batch(boards, workers=2, timeout=20))
+    assert [result["index"] for result in results] == [0, 1, 2, 3], "Results are out of order!"
+    for board, result in zip(boards, results):
+        assert result["status"] == "solved", result
+        assert replay(board, result["moves"]) == solver2021.GOAL_BOARD, "Path found was wrong!"
+
+
+def test_solution_cache_answers_boards_on_the_path(tmp_path):
+    board = scramble(6, 11)
+    cache = solver2021.SolutionCache(str(tmp_path / "solutions"))
+    path = solver2021.solve(board, heuristic="h3", cache=cache)
+    cache.close()
+
+    cache = solver2021.SolutionCache(str(tmp_path / "solutions"))
+    assert cache.get(solver2021.pack_board(board)) == path, "Solution was not kept on disk!"
+    middle = replay(board, path[:2])
+    assert cache.get(middle) == path[2:], "Boards on the path were not cached!"
+    assert solver2021.solve(solver2021.unpack_board(middle), cache=cache) == path[2:]
+    cache.close()
+
+
+def test_solution_cache_keeps_other_solutions_from_optimal_searches():
+    board = scramble(8, 12)
+    cache = solver2021.SolutionCache()
+    # a solution, but not a shortest one: row 1 turned all the way round at the end
+    detour = solver2021.solve(board, heuristic="h3") + ["L1"] * solver2021.COLS
+    cache.put(solver2021.pack_board(board), detour)
+    assert cache.get(solver2021.pack_board(board)) == detour
+    assert cache.get(solver2021.pack_board(board), optimal=True) is None
+    path = solver2021.solve(board, heuristic="h3", cache=cache)
+    assert len(path) == len(detour) - solver2021.COLS, "An optimal search returned a cached solution which isn't shortest!"
+    assert cache.get(solver2021.pack_board(board), optimal=True) == path
+
+
+def test_idastar_transposition_table_size_is_read_when_searching(monkeypatch):
+    shape = (3, 3)
+    board = scramble(6, 1, solver2021.get_puzzle(*shape))
+    moves, with_table = solver2021.solve(board, "h", "idastar", return_stats=True, shape=shape)
+    assert with_table.duplicates > 0
+    without_table = solver2021.solve(board, "h", "idastar", return_stats=True, shape=shape, table_size=0)
+    assert without_table[1].duplicates == 0 and len(without_table[0]) == len(moves)
+    monkeypatch.setattr(solver2021, "TRANSPOSITION_TABLE_SIZE", 0)
+    assert solver2021.solve(board, "h", "idastar", return_stats=True, shape=shape)[1].duplicates == 0
+
+
+@pytest.mark.parametrize("engine", solver2021.ENGINES)
+def test_search_stats(engine):
+    board = scramble(5, 8)
+    path, stats = solver2021.solve(board, heuristic="h3", engine=engine, return_stats=True)
+    assert replay(board, path) == solver2021.GOAL_BOARD, "Path found was wrong!"
+    assert stats.expanded > 0 and stats.generated >= stats.expanded, stats.as_dict()
+    assert "search" in stats.phases
+
+
+@pytest.mark.parametrize("shape", [(4, 5), (3, 6), (6, 6), (7, 7)])
+def test_pattern_groups_split_rows_evenly(shape):
+    puzzle = solver2021.Puzzle(*shape)
+    sizes = [len(group) for group in puzzle.pattern_groups]
+    assert sorted(tile for group in puzzle.pattern_groups for tile in group) == list(range(1, puzzle.size + 1))
+    assert max(sizes) - min(sizes) <= 1 and puzzle.size ** max(sizes) <= solver2021.PDB_MAX_ENTRIES
+
+
+@pytest.mark.parametrize("shape", [(3, 3), (3, 4), (4, 4)])
+@pytest.mark.parametrize("engine,heuristic", [("idastar", "h3"), ("astar", "h3"), ("numpy", "h3"),
+                                              ("bidirectional", "h1"), ("astar", "h1")])
+def test_other_board_sizes(shape, engine, heuristic):
+    puzzle = solver2021.get_puzzle(*shape)
+    board = scramble(5, 11, puzzle)
+    path = solver2021.solve(board, heuristic=heuristic, engine=engine, shape=shape)
+    assert replay(board, path, puzzle) == puzzle.goal, "Path found was wrong!"
+    if heuristic == "h3" or engine == "bidirectional":
+        assert len(path) == bfs_length(board, puzzle), "Not the shortest path!"
+
+
+def test_unsolvable_board_is_rejected():
+    with pytest.raises(Exception, match="can't be solved"):
+        solver2021.solve([1, 2, 3, 4, 5, 6, 7, 9, 8], shape=(3, 3))
@@ -1,237 +1,1397 @@
-#!/usr/local/bin/python3
-# route.py : Find routes through maps
-#
-# Code by: Shoiab Mohammed , Vijay
-#
-# Based on skeleton code by V. Mathur and D. Crandall, January 2021
-
-
-# !/usr/bin/env python3
-import sys
-import math
-import re
-
-
-class City:
-    def __init__(self, name, latitude, longitude):
-        self.name = name
-        self.longitude = longitude
-        self.latitude = latitude
-        self.cameFrom = None
-        self.neighbors = []
-        self.visited = 0
-        self.gscore = math.inf
-        self.fscore = math.inf
-
-
-class Neighbor:
-    def __init__(self, City, Highway, SpeedLimit, Distance):
-        self.city = City
-        self.highway = Highway
-        self.distance = Distance
-        self.speedlimit = SpeedLimit
-        self.timetaken = (self.distance)/(self.speedlimit)
-        self.accidents = 2 if "I-" in self.highway else 1
-
-
-def GenerateCities():
-    f = open("city-gps.txt")
-    Cities = {}
-    for i in f.readlines():
-        if i.split()[0] not in Cities:
-            Cities[i.split()[0]] = City(i.split()[0], i.split()[1], i.split()[2])
-    f = open("road-segments.txt")
-    for i in f.read().splitlines():
-        city1 = i.split(' ')[0]
-        city2 = i.split(' ')[1]
-        if city1 not in Cities:
-            Cities[city1] = City(city1, 0, 0)
-        if city2 not in Cities:
-            Cities[city2] = City(city2, 0, 0)
-        Cities[city1].neighbors.append(Neighbor(Cities[city2], str(i.split(' ')[4]), int(i.split(' ')[3]), int(i.split(' ')[2])))
-        Cities[city2].neighbors.append(Neighbor(Cities[city1], str(i.split(' ')[4]), int(i.split(' ')[3]), int(i.split(' ')[2])))
-    return Cities
-
-
-#https://stackoverflow.com/questions/28994289/calculate-euclidean-distance-with-google-maps-coordinates
-#If the two points are near each other, for example in the same city, estimating the great circle with a straight line in the latitude-longitude space will produce minimal error, and be a lot faster to calculate. A minor complication is the fact that the length of a degree of longitude depends on the latitude: a degree of longitude spans 111km on the Equator, but half of that on 60° north. Adjusting for this is easy: multiply the longitude by the cosine of the latitude. Then you can just
-# take the Euclidean distance between the two points, and multiply by the length of a degree:
-
-def heuristic1(Cities,current_city,goal_city):
-    if current_city.latitude == 0:
-        return 0
-    Lat1 = float(Cities[current_city.name].latitude)
-    Lon1 = float(Cities[current_city.name].longitude)
-    Lat2 = float(Cities[goal_city].latitude)
-    Lon2 = float(Cities[goal_city].longitude)
-    deglen = 110.25
-    x = Lat1 - Lat2
-    y = (Lon1-Lon2) * math.cos(Lat2)
-    return deglen * math.sqrt(x * x + y * y)
-
-
-def heuristic2(Cities, current_city, goal_city):
-    if current_city.latitude == 0:
-        return 0
-    Lat1 = float(Cities[current_city.name].latitude)
-    Lon1 = float(Cities[current_city.name].longitude)
-    Lat2 = float(Cities[goal_city].latitude)
-    Lon2 = float(Cities[goal_city].longitude)
-    return getDistanceFromLatLonInKm(Lat1, Lon1, Lat2, Lon2)*0.621371   # conversion from km to miles
-
-
-# https://stackoverflow.com/questions/27928/calculate-distance-between-two-latitude-longitude-points-haversine-formula
-def getDistanceFromLatLonInKm(lat1,lon1,lat2,lon2):
-      R = 6371; #Radius of the earth in km
-      dLat = deg2rad(lat2-lat1)
-      dLon = deg2rad(lon2-lon1)
-      a = math.sin(dLat/2) * math.sin(dLat/2) + math.cos(deg2rad(lat1)) * math.cos(deg2rad(lat2)) * math.sin(dLon/2) * math.sin(dLon/2)
-      c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a));
-      d = R * c;
-      return d
-
-
-def deg2rad(deg):
-    return deg * (math.pi/180)
-
-#https://stackoverflow.com/questions/27928/calculate-distance-between-two-latitude-longitude-points-haversine-formula
-def heuristic3(Cities, current_city, goal_city):
-    if current_city.latitude == 0:
-        return 0
-    lat1 = float(Cities[current_city.name].latitude)
-    lon1 = float(Cities[current_city.name].longitude)
-    lat2 = float(Cities[goal_city].latitude)
-    lon2 = float(Cities[goal_city].longitude)
-    p = math.pi / 180
-    a = 0.5 - math.cos((lat2 - lat1) * p) / 2 + math.cos(lat1 * p) * math.cos(lat2 * p) * (1 - math.cos((lon2 - lon1) * p)) / 2
-    return 12742 * math.asin(math.sqrt(a))*0.621371 # conversion from km to miles
-
-
-def reconstructPath(current, start):
-    route = []
-    distance : float = 0
-    segments = 0
-    time = 0
-    accidents = 0
-    while current.name != start:
-        neighbor = [i for i in current.neighbors if current.cameFrom.name == i.city.name]
-        route.append((current.name, "{0} for {1} miles".format(neighbor[0].highway, neighbor[0].distance)))
-        distance += neighbor[0].distance
-        segments += 1
-        time += neighbor[0].timetaken
-        accidents += neighbor[0].accidents
-        current = current.cameFrom
-    return {"total-segments": segments,
-            "total-miles": float(distance),
-            "total-hours": time,
-            "total-expected-accidents": accidents/(10**6),
-            "route-taken": route[::-1]}
-
-
-def get_route(start, end, cost):
-
-    """
-    Find shortest driving route between start city and end city based on a cost function.
-
-    1. Your function should return a dictionary having the following keys:
-        -"route-taken" : a list of pairs of the form (next-stop, segment-info), where
-           next-stop is a string giving the next stop in the route, and segment-info is a free-form
-           string containing information about the segment that will be displayed to the user.
-           (segment-info is not inspected by the automatic testing program).
-        -"total-segments": an integer indicating number of segments in the route-taken
-        -"total-miles": a float indicating total number of miles in the route-taken
-        -"total-hours": a float indicating total amount of time in the route-taken
-        -"total-expected-accidents": a float indicating the expected accident count on the route taken
-    2. Do not add any extra parameters to the get_route() function, or it will break our grading and testing code.
-    3. Please do not use any global variables, as it may cause the testing code to fail.
-    4. You can assume that all test cases will be solvable.
-    5. The current code just returns a dummy solution.
-    """
-
-    Cities = GenerateCities()
-    if cost == "segments":
-        return findsmallestpath(Cities, start, end, "segments")
-    elif cost == "distance":
-        return findsmallestpath(Cities, start, end, "distance")
-    elif cost == "time":
-        return findsmallestpath(Cities, start, end, "time")
-    else:
-        return findsmallestpath(Cities, start, end, "safe")
-
-
-def findsmallestpath(Cities, start, end, cost_function):
-    fringe = [Cities[start]]
-    Cities[start].gscore = 0
-
-    hscore = 0
-    while fringe:
-        current = fringe.pop(fringe.index(min(fringe, key=lambda t: t.fscore)))
-        current.visited = 1
-        if current.name == end:
-            return reconstructPath(current, start)
-        for neighbor in current.neighbors:
-            if cost_function == "segments":
-                cost = 1
-                hscore = 0
-            elif cost_function =="distance":
-                cost = neighbor.distance
-                hscore = heuristic3(Cities, neighbor.city, end)
-            elif cost_function == "time":
-                cost = neighbor.timetaken
-                hscore = heuristic3(Cities, neighbor.city, end)/ neighbor.speedlimit # dividing distance by the speed limit
-            else:
-                cost = neighbor.accidents
-                hscore = 0
-            if neighbor.city not in fringe:
-                if neighbor.city.visited == 1:
-                    if neighbor.city.gscore > current.gscore + cost:
-                        neighbor.city.cameFrom = current
-                        neighbor.city.gscore = current.gscore + cost
-                        neighbor.city.fscore = current.gscore + hscore
-                else:
-                    neighbor.city.cameFrom = current
-                    neighbor.city.gscore = current.gscore + cost
-                    neighbor.city.fscore = current.gscore + hscore
-                    fringe.append(neighbor.city)
-            else:
-                if neighbor.city.gscore > current.gscore + cost:
-                    neighbor.city.cameFrom = current
-                    neighbor.city.gscore = current.gscore + cost
-                    neighbor.city.fscore = current.gscore + hscore
-    return ""
-
-
-
-    #    route_taken = [("Martinsville,_Indiana","IN_37 for 19 miles"),
-    #                   ("Jct_I-465_&_IN_37_S,_Indiana","IN_37 for 25 miles"),
-    #                   ("Indianapolis,_Indiana","IN_37 for 7 miles")]
-
-    #    return {"total-segments" : len(route_taken),
-    #            "total-miles" : 51,
-    #            "total-hours" : 1.07949,
-    #            "total-expected-accidents" : 0.000051,
-    #            "route-taken" : route_taken}
-
-
-# Please don't modify anything below this line
-if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        raise(Exception("Error: expected 3 arguments"))
-
-    (_, start_city, end_city, cost_function) = sys.argv
-    if cost_function not in ("segments", "distance", "time", "safe"):
-        raise(Exception("Error: invalid cost function"))
-
-    result = get_route(start_city, end_city, cost_function)
-
-    # Pretty print the route
-    print("Start in %s" % start_city)
-    for step in result["route-taken"]:
-        print("  Then go to %s via %s" % step)
-
-    print("\n Total segments: %6d" % result["total-segments"])
-    print("    Total miles: %10.3f" % result["total-miles"])
-    print("    Total hours: %10.3f" % result["total-hours"])
-    print("Total accidents: %15.8f" % result["total-expected-accidents"])
-
-
+#!/usr/local/bin/python3
+# route.py : Find routes through maps
+#
+# Code by: Shoiab Mohammed , Vijay
+#
+# Based on skeleton code by V. Mathur and D. Crandall, January 2021
+
+
+# !/usr/bin/env python3
+import sys
+import os
+import math
+import re
+import json
+import hashlib
+import functools
+import time
+import heapq
+import bisect
+import collections
+import multiprocessing
+import numpy as np
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+GRAPH_SOURCES = ("city-gps.txt", "road-segments.txt")
+GRAPH_CACHE_DIR = os.path.join(DATA_DIR, "graph-cache")
+GRAPH_CACHE_VERSION = 2
+COST_FUNCTIONS = ("segments", "distance", "time", "safe")
+BIDIRECTIONAL_COSTS = ("segments", "safe")     # cost functions where great circle distance is a poor heuristic
+LOCATED_RATIO = 0.8     # lowest road miles per great circle mile between the cities trusted for heuristics
+EARTH_RADIUS = 6371 * 0.621371      # miles
+
+
+class RoadGraph:
+    """
+    The road network in compressed sparse row form. Cities (and junctions) are numbered 0 .. n-1, the roads leaving
+    node i are the edges offsets[i] .. offsets[i+1]-1, and every edge has its other end in targets and its length,
+    speed limit, highway (an index into highways) and road segment (line of road-segments.txt) in parallel arrays.
+    Each road segment gives 2 edges, one each way. latitude and longitude are nan for the junctions missing from
+    city-gps.txt.
+
+    RoadGraph.load() parses the text files once and saves the arrays as .npy files in GRAPH_CACHE_DIR, which later
+    runs memory map instead of parsing ~17k lines again. The cache is rebuilt when the size and modification time of
+    a source file change and its sha256 doesn't match either
+
+    located and scales give the A* heuristics, see locate()
+    """
+
+    ARRAYS = ("latitude", "longitude", "offsets", "targets", "distance", "speed", "highway", "segment", "located")
+
+    def __init__(self, names, highways, latitude, longitude, offsets, targets, distance, speed, highway, segment,
+                 located=None, scales=None):
+        self.names = names
+        self.index = {name: node for node, name in enumerate(names)}
+        self.highways = highways
+        self.latitude = latitude
+        self.longitude = longitude
+        self.offsets = offsets
+        self.targets = targets
+        self.distance = distance
+        self.speed = speed
+        self.highway = highway
+        self.segment = segment
+        self.adjacency_lists = None  # offsets and targets as lists, see adjacency()
+        if located is None:
+            located, scales = self.locate()
+        self.located = located
+        self.scales = scales
+        self.cache_dir = None       # set by load(), where data derived from the graph is kept
+        self.key = None             # set by load(), identifies the source files the graph was built from
+
+    def __len__(self):
+        return len(self.names)
+
+    def edges(self, node):
+        """
+        Returns the range of edge numbers leaving a node
+        """
+        return range(self.offsets[node], self.offsets[node + 1])
+
+    def adjacency(self):
+        """
+        Returns offsets and targets as lists, made on the first call - searches index lists much faster than arrays
+        """
+        if self.adjacency_lists is None:
+            self.adjacency_lists = self.offsets.tolist(), self.targets.tolist()
+        return self.adjacency_lists
+
+    def edge_costs(self, cost_function):
+        """
+        Returns the cost of every edge under a cost function - 1 per segment, miles, hours (miles / speed limit), or
+        expected accidents in millions (2 on interstates, whose highway name has "I-", 1 elsewhere)
+        """
+        if cost_function == "segments":
+            return np.ones(len(self.targets))
+        if cost_function == "distance":
+            return self.distance.astype(np.float64)
+        if cost_function == "time":
+            return self.distance / self.speed
+        interstate = np.array(["I-" in highway for highway in self.highways])
+        return np.where(interstate[self.highway], 2.0, 1.0)
+
+    def nearest_located(self, costs, located, sources):
+        """
+        Yields (cost, u, v) for every node u of sources and every located node v that u reaches through unlocated nodes
+        only, with the cost of the cheapest such path
+        """
+        through = (~np.asarray(located)).tolist()
+        for u in sources:
+            for v, cost in self.dijkstra(costs, u, through=through).items():
+                if v != u and located[v]:
+                    yield cost, u, v
+
+    def dijkstra(self, costs, source, targets=None, through=None):
+        """
+        Returns {node: cost of the cheapest route from source} for every node source reaches, by Dijkstra.
+
+        With targets (node numbers), the search stops as soon as all of them are settled - their costs are exact, other
+        nodes may hold the cost of a route that isn't the cheapest. With through (a boolean per node), routes only go
+        on from the nodes where it is True: the others are reached but not expanded
+        """
+        offsets, edge_targets = self.adjacency()
+        remaining = set(targets) if targets is not None else None
+        gscore = {source: 0}
+        fringe = [(0, source)]
+        while fringe:
+            score, current = heapq.heappop(fringe)
+            if score > gscore[current]:
+                continue
+            if remaining is not None:
+                remaining.discard(current)
+                if not remaining:
+                    break
+            if through is not None and current != source and not through[current]:
+                continue
+            for edge in range(offsets[current], offsets[current + 1]):
+                neighbor = edge_targets[edge]
+                if score + costs[edge] < gscore.get(neighbor, math.inf):
+                    gscore[neighbor] = score + costs[edge]
+                    heapq.heappush(fringe, (score + costs[edge], neighbor))
+        return gscore
+
+    def shortest_costs(self, costs, source, targets=None):
+        """
+        Returns the cost of the cheapest route from source to every node (inf where there is none) as an array. With
+        targets, only their costs are sure to be exact, see dijkstra
+        """
+        gscore = self.dijkstra(costs, source, targets)
+        result = np.full(len(self.names), math.inf)
+        result[list(gscore)] = list(gscore.values())
+        return result
+
+    def hops(self, costs, located):
+        """
+        Yields (cost, great circle miles, u, v) for every pair of located nodes u, v joined by a path whose interior
+        nodes are all unlocated, with the cost of the cheapest such path. Any route between located nodes is a chain
+        of hops
+        """
+        latitude, longitude = self.latitude.tolist(), self.longitude.tolist()
+        for cost, u, v in self.nearest_located(costs, located, np.flatnonzero(located).tolist()):
+            yield cost, great_circle_miles(latitude[u], longitude[u], latitude[v], longitude[v]), u, v
+
+    def gateways(self, costs, located):
+        """
+        Returns, in compressed sparse row form (offsets, nodes, costs), the located nodes that every unlocated node
+        reaches through unlocated nodes only and the cost of getting there. Located nodes have none
+        """
+        unlocated = np.flatnonzero(~np.asarray(located)).tolist()
+        found = collections.defaultdict(list)
+        for cost, u, v in self.nearest_located(costs, located, unlocated):
+            found[u].append((v, cost))
+        offsets = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum([len(found[u]) if u in found else 0 for u in range(len(self.names))], out=offsets[1:])
+        pairs = [pair for u in unlocated for pair in found[u]]
+        return (offsets, np.array([v for v, cost in pairs], dtype=np.int64),
+                np.array([cost for v, cost in pairs], dtype=np.float64))
+
+    def locate(self):
+        """
+        Picks the cities whose coordinates the heuristics can trust, and the scale of each cost function.
+
+        1. Some coordinates in city-gps.txt are far off (or the road lengths are), e.g. 2 miles of road between cities
+           2000 miles apart, so great circle distances are not a lower bound on road miles as they are.
+        2. Every hop (see hops) that is shorter than LOCATED_RATIO times its great circle distance is a conflict, and
+           the city in most conflicts is dropped (treated like a junction without GPS) until there are none left, which
+           drops ~600 of ~5500 cities. Hops are computed again after each round, through the dropped cities.
+        3. The scale of a cost function is the smallest cost per great circle mile over all hops between the remaining
+           cities. By the triangle inequality any route from a located city to a located goal costs at least
+           scale * great circle distance, so that is an admissible heuristic (0 from unlocated nodes).
+
+        Returns (located, {cost function: scale})
+        """
+        located = ~np.isnan(self.latitude)
+        distance = self.edge_costs("distance").tolist()
+        while True:
+            conflicts = {(min(u, v), max(u, v)) for cost, miles, u, v in self.hops(distance, located)
+                         if cost < LOCATED_RATIO * miles}
+            if not conflicts:
+                break
+            while conflicts:
+                node = collections.Counter(node for pair in conflicts for node in pair).most_common(1)[0][0]
+                located[node] = False
+                conflicts = {pair for pair in conflicts if node not in pair}
+        scales = {}
+        for cost_function in COST_FUNCTIONS:
+            scales[cost_function] = min((cost / miles for cost, miles, u, v in
+                                         self.hops(self.edge_costs(cost_function).tolist(), located) if miles > 0),
+                                        default=0.0)
+        return located, scales
+
+    @classmethod
+    def parse(cls, data_dir=DATA_DIR):
+        """
+        Builds the graph from city-gps.txt and road-segments.txt. Cities keep the order of city-gps.txt (the first
+        line wins for a city listed twice), junctions follow in order of first appearance, and the edges of every node
+        keep the order of road-segments.txt
+        """
+        names, index, latitude, longitude = [], {}, [], []
+
+        def node(name):
+            if name not in index:
+                index[name] = len(names)
+                names.append(name)
+                latitude.append(math.nan)
+                longitude.append(math.nan)
+            return index[name]
+
+        with open(os.path.join(data_dir, "city-gps.txt")) as file:
+            for line in file:
+                fields = line.split()
+                if len(fields) == 3 and fields[0] not in index:
+                    node(fields[0])
+                    latitude[-1], longitude[-1] = float(fields[1]), float(fields[2])
+
+        ends, distance, speed, highway, highways = [], [], [], [], {}
+        with open(os.path.join(data_dir, "road-segments.txt")) as file:
+            for line in file:
+                fields = line.split()
+                if len(fields) != 5:
+                    continue
+                ends.append((node(fields[0]), node(fields[1])))
+                distance.append(int(fields[2]))
+                speed.append(int(fields[3]))
+                highway.append(highways.setdefault(fields[4], len(highways)))
+
+        # both directions of segment k are edges 2k and 2k+1 before sorting by source node; the stable sort keeps the
+        # edges of each node in file order
+        sources = np.array(ends, dtype=np.int32).reshape(-1, 2)
+        order = np.argsort(sources.ravel(), kind="stable")
+        segment = (order // 2).astype(np.int32)
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources.ravel(), minlength=len(names)), out=offsets[1:])
+        return cls(names, list(highways), np.array(latitude), np.array(longitude), offsets,
+                   sources[:, ::-1].ravel()[order], np.array(distance, dtype=np.int32)[segment],
+                   np.array(speed, dtype=np.int32)[segment], np.array(highway, dtype=np.int32)[segment], segment)
+
+    @classmethod
+    def load(cls, data_dir=DATA_DIR, cache_dir=None):
+        """
+        Returns the graph of the text files in data_dir, memory mapped from cache_dir (GRAPH_CACHE_DIR for the default
+        data) when the cache is up to date, parsed and saved to the cache otherwise
+        """
+        if cache_dir is None:
+            cache_dir = GRAPH_CACHE_DIR if data_dir == DATA_DIR else os.path.join(data_dir, "graph-cache")
+        meta_path = os.path.join(cache_dir, "meta.json")
+        sources = [os.stat(os.path.join(data_dir, name)) for name in GRAPH_SOURCES]
+        try:
+            with open(meta_path) as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            meta = None
+        if meta is not None and meta.get("version") == GRAPH_CACHE_VERSION:
+            fresh = all([source.st_size, source.st_mtime_ns] == [known["size"], known["mtime_ns"]]
+                        for source, known in zip(sources, meta["sources"]))
+            if not fresh and all(source.st_size == known["size"] and file_hash(data_dir, name) == known["sha256"]
+                                 for source, known, name in zip(sources, meta["sources"], GRAPH_SOURCES)):
+                fresh = True        # touched (e.g. by a checkout) but not changed - only the times need updating
+                meta["sources"] = source_signature(data_dir)
+                write_json(meta_path, meta)
+            if fresh:
+                try:
+                    arrays = [np.load(os.path.join(cache_dir, name + ".npy"), mmap_mode="r") for name in cls.ARRAYS]
+                    graph = cls(meta["names"], meta["highways"], *arrays, scales=meta["scales"])
+                    graph.cache_dir, graph.key = cache_dir, sources_key(meta["sources"])
+                    return graph
+                except (OSError, ValueError):
+                    pass
+        graph = cls.parse(data_dir)
+        signature = source_signature(data_dir)
+        graph.cache_dir, graph.key = cache_dir, sources_key(signature)
+        try:
+            graph.save(cache_dir, signature)
+        except OSError:
+            pass                    # read-only checkout - parse again next time
+        return graph
+
+    def save(self, cache_dir, sources):
+        """
+        Writes the arrays as .npy files and the names and source signature to meta.json, last, so a cache interrupted
+        halfway is never taken as up to date
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        meta_path = os.path.join(cache_dir, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name in self.ARRAYS:
+            path = os.path.join(cache_dir, name + ".npy")
+            temporary = path + ".%d.tmp" % os.getpid()
+            with open(temporary, "wb") as file:
+                np.save(file, getattr(self, name))
+            os.replace(temporary, path)
+        write_json(meta_path, {"version": GRAPH_CACHE_VERSION, "sources": sources, "names": self.names,
+                               "highways": self.highways, "scales": self.scales})
+
+
+def file_hash(data_dir, name):
+    digest = hashlib.sha256()
+    with open(os.path.join(data_dir, name), "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_signature(data_dir):
+    """
+    Returns the size, modification time and sha256 of every file of GRAPH_SOURCES
+    """
+    signature = []
+    for name in GRAPH_SOURCES:
+        source = os.stat(os.path.join(data_dir, name))
+        signature.append({"file": name, "size": source.st_size, "mtime_ns": source.st_mtime_ns,
+                          "sha256": file_hash(data_dir, name)})
+    return signature
+
+
+def sources_key(signature):
+    return "-".join(source["sha256"] for source in signature)
+
+
+def write_json(path, data):
+    temporary = path + ".%d.tmp" % os.getpid()
+    with open(temporary, "w") as file:
+        json.dump(data, file)
+    os.replace(temporary, path)
+
+
+# https://stackoverflow.com/questions/27928/calculate-distance-between-two-latitude-longitude-points-haversine-formula
+def great_circle_miles(lat1, lon1, lat2, lon2):
+    p = math.pi / 180
+    a = 0.5 - math.cos((lat2 - lat1) * p) / 2 + math.cos(lat1 * p) * math.cos(lat2 * p) * (1 - math.cos((lon2 - lon1) * p)) / 2
+    return 12742 * math.asin(math.sqrt(a))*0.621371 # conversion from km to miles
+
+
+class ContractionHierarchy:
+    """
+    A contraction hierarchy of the road graph for one cost function.
+
+    1. Nodes are contracted one at a time, least important first (see build). Contracting v removes it from the graph
+       and, for every pair of its remaining neighbours u, w whose cheapest connection went through v, adds a shortcut
+       edge u - w with the cost of u - v - w.
+    2. rank is the order of contraction. The edges kept are the upward ones, from a node to neighbours of higher rank
+       (still in the graph when it was contracted), in compressed sparse row form (offsets, targets, weights, via).
+    3. via is the node a shortcut skips, or -1 - e for an edge e of the road graph (the cheapest of parallel roads).
+    4. Every cheapest route goes up the ranks and then down, so query runs a Dijkstra search up from the start and one
+       up from the end, which only see a few hundred nodes, and unpack expands shortcuts back into road edges
+    """
+
+    WITNESS_LIMIT = 500         # nodes settled by a witness search before a shortcut is added anyway
+    VERSION = 1                 # of build() and the saved file - bump it when either changes, to reject old files
+
+    def __init__(self, rank, offsets, targets, weights, via):
+        self.rank = rank.tolist()
+        self.offsets = offsets.tolist()
+        self.targets = targets.tolist()
+        self.weights = weights.tolist()
+        self.via = via.tolist()
+
+    @classmethod
+    def build(cls, graph, costs):
+        """
+        Contracts the nodes of graph with edge costs costs (a list). The next node is the one with the smallest edge
+        difference (shortcuts it needs minus edges it removes) plus the number of its neighbours already contracted,
+        which spreads contraction evenly over the map. Priorities are updated lazily: a popped node is contracted if
+        its priority, computed again, is still the smallest
+        """
+        size = len(graph)
+        offsets, targets = graph.offsets.tolist(), graph.targets.tolist()
+        adjacent = [{} for _ in range(size)]        # adjacent[u][v] = (weight, via) of the remaining graph
+        for u in range(size):
+            for edge in range(offsets[u], offsets[u + 1]):
+                v = targets[edge]
+                if v != u and (v not in adjacent[u] or costs[edge] < adjacent[u][v][0]):
+                    adjacent[u][v] = (costs[edge], -1 - edge)
+        rank = [-1] * size
+        contracted_neighbors = [0] * size
+
+        def shortcuts(v):
+            """The shortcuts contracting v needs, as (u, w, weight)"""
+            neighbors = [(u, weight) for u, (weight, via) in adjacent[v].items() if rank[u] < 0]
+            needed = []
+            for i, (u, weight_u) in enumerate(neighbors[:-1]):
+                wanted = {w: weight_u + weight_w for w, weight_w in neighbors[i + 1:]}
+                limit = max(wanted.values())
+                gscore, fringe, settled = {u: 0}, [(0, u)], 0
+                while fringe and settled < cls.WITNESS_LIMIT:
+                    score, current = heapq.heappop(fringe)
+                    if score > gscore[current]:
+                        continue
+                    if score > limit:
+                        break
+                    settled += 1
+                    for x, (weight, via) in adjacent[current].items():
+                        if x != v and rank[x] < 0 and score + weight < gscore.get(x, math.inf):
+                            gscore[x] = score + weight
+                            heapq.heappush(fringe, (score + weight, x))
+                needed += [(u, w, weight) for w, weight in wanted.items() if gscore.get(w, math.inf) > weight]
+            return needed
+
+        def priority(v):
+            return len(shortcuts(v)) - sum(rank[u] < 0 for u in adjacent[v]) + contracted_neighbors[v]
+
+        fringe = [(priority(v), v) for v in range(size)]
+        heapq.heapify(fringe)
+        order = 0
+        while fringe:
+            old, v = heapq.heappop(fringe)
+            needed = shortcuts(v)
+            new = len(needed) - sum(rank[u] < 0 for u in adjacent[v]) + contracted_neighbors[v]
+            if fringe and new > fringe[0][0]:
+                heapq.heappush(fringe, (new, v))
+                continue
+            rank[v] = order
+            order += 1
+            for u, w, weight in needed:
+                if w not in adjacent[u] or weight < adjacent[u][w][0]:
+                    adjacent[u][w] = adjacent[w][u] = (weight, v)
+            for u in adjacent[v]:
+                contracted_neighbors[u] += 1
+
+        upward = [sorted((u, weight, via) for u, (weight, via) in adjacent[v].items() if rank[u] > rank[v])
+                  for v in range(size)]
+        edges = [edge for arcs in upward for edge in arcs]
+        return cls(np.array(rank, dtype=np.int32), np.cumsum([0] + [len(arcs) for arcs in upward]),
+                   np.array([u for u, weight, via in edges], dtype=np.int32),
+                   np.array([weight for u, weight, via in edges], dtype=np.float64),
+                   np.array([via for u, weight, via in edges], dtype=np.int64))
+
+    @staticmethod
+    def path(graph, cost_function):
+        return os.path.join(graph.cache_dir, "hierarchy-%s.npz" % cost_function)
+
+    def save(self, path, key):
+        temporary = path + ".%d.tmp.npz" % os.getpid()
+        np.savez(temporary, key=np.array(key), version=np.array([GRAPH_CACHE_VERSION, self.VERSION]),
+                 rank=np.array(self.rank, dtype=np.int32), offsets=self.offsets,
+                 targets=np.array(self.targets, dtype=np.int32), weights=self.weights, via=self.via)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path, key):
+        """
+        Returns the hierarchy saved at path, or None if there is none or it was built from other source files or by
+        another version
+        """
+        try:
+            with np.load(path) as data:
+                if str(data["key"]) != key or data["version"].tolist() != [GRAPH_CACHE_VERSION, cls.VERSION]:
+                    return None
+                return cls(data["rank"], data["offsets"], data["targets"], data["weights"], data["via"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def query(self, start, end):
+        """
+        Returns (cost, road edges from start to end) of the cheapest route, or None when there is none. The two
+        upward searches take turns by smallest key, and stop once neither can beat the best meeting node found
+        """
+        gscores = ({start: 0}, {end: 0})
+        parents = ({}, {})
+        fringes = ([(0, start)], [(0, end)])
+        best, meeting = (0, start) if start == end else (math.inf, None)
+        while True:
+            side = min((side for side in (0, 1) if fringes[side]), key=lambda side: fringes[side][0][0], default=None)
+            if side is None or fringes[side][0][0] >= best:
+                break
+            score, current = heapq.heappop(fringes[side])
+            if score > gscores[side][current]:
+                continue
+            if current in gscores[1 - side] and score + gscores[1 - side][current] < best:
+                best, meeting = score + gscores[1 - side][current], current
+            for arc in range(self.offsets[current], self.offsets[current + 1]):
+                neighbor = self.targets[arc]
+                if score + self.weights[arc] < gscores[side].get(neighbor, math.inf):
+                    gscores[side][neighbor] = score + self.weights[arc]
+                    parents[side][neighbor] = current
+                    heapq.heappush(fringes[side], (score + self.weights[arc], neighbor))
+        if meeting is None:
+            return None
+        up, node = [], meeting
+        while node != start:
+            up.append((parents[0][node], node))
+            node = parents[0][node]
+        down, node = [], meeting
+        while node != end:
+            down.append((node, parents[1][node]))
+            node = parents[1][node]
+        return best, [edge for u, v in up[::-1] + down for edge in self.unpack(u, v)]
+
+    def unpack(self, u, v):
+        """
+        Returns the road edges, in order, of the hierarchy edge between u and v travelled from u to v, as (edge,
+        forward) pairs - forward is False when the road edge is stored in the other direction (from v's side).
+        Shortcuts are expanded with a stack rather than recursion, since they nest deeply on long roads
+        """
+        edges, stack = [], [(u, v)]
+        while stack:
+            a, b = stack.pop()
+            low, high = (a, b) if self.rank[a] < self.rank[b] else (b, a)
+            arc = next(arc for arc in range(self.offsets[low], self.offsets[low + 1]) if self.targets[arc] == high)
+            via = self.via[arc]
+            if via >= 0:
+                stack += [(via, b), (a, via)]
+            else:
+                edges.append((-1 - via, a == low))
+        return edges
+
+
+class Landmarks:
+    """
+    Landmark (ALT) lower bounds. For a landmark L, the triangle inequality gives cost(v, goal) >= cost(L, goal) -
+    cost(L, v) and >= cost(L, v) - cost(L, goal), so with the cost from a few landmarks to every node stored, the largest
+    of these differences is an admissible heuristic - a much tighter one than great circle distances for time and safe,
+    where distance says little about the cost.
+
+    nodes holds the landmarks and tables[cost function] a (landmarks, nodes) float32 array of costs, rounded down so
+    that a stored cost is never above the exact one
+    """
+
+    COUNT = 16
+    VERSION = 2                 # of build() and the saved file - bump it when either changes, to reject old files
+
+    def __init__(self, nodes, tables):
+        self.nodes = nodes
+        self.tables = tables
+        # the stored costs as float64, and one float32 step up - the exact cost lies between the two
+        self.low = {name: table.astype(np.float64) for name, table in tables.items()}
+        self.high = {name: np.nextafter(table, np.float32(np.inf)).astype(np.float64) for name, table in tables.items()}
+
+    @classmethod
+    def build(cls, graph, count=COUNT):
+        """
+        Picks count landmarks by farthest point selection on road miles - each one is the node farthest from the
+        landmarks already picked (the first one the node farthest from node 0), so they end up spread around the edges
+        of the map - and runs Dijkstra from each of them for every cost function
+        """
+        distance = graph.edge_costs("distance").tolist()
+        nearest = graph.shortest_costs(distance, 0)
+        nodes, miles = [], []
+        for _ in range(min(count, len(graph))):
+            node = int(np.argmax(np.where(np.isfinite(nearest), nearest, -1)))
+            nodes.append(node)
+            miles.append(graph.shortest_costs(distance, node))
+            # node 0 only picks the first landmark - from then on, the distance to the nearest landmark picked
+            nearest = miles[-1] if len(nodes) == 1 else np.minimum(nearest, miles[-1])
+        tables = {}
+        for cost_function in COST_FUNCTIONS:
+            if cost_function == "distance":
+                exact = np.array(miles)
+            else:
+                costs = graph.edge_costs(cost_function).tolist()
+                exact = np.array([graph.shortest_costs(costs, node) for node in nodes])
+            table = exact.astype(np.float32)
+            tables[cost_function] = np.where(table > exact, np.nextafter(table, np.float32(-np.inf)), table)
+        return cls(np.array(nodes, dtype=np.int64), tables)
+
+    @staticmethod
+    def path(graph):
+        return os.path.join(graph.cache_dir, "landmarks.npz")
+
+    def save(self, path, key):
+        temporary = path + ".%d.tmp.npz" % os.getpid()
+        np.savez(temporary, key=np.array(key), version=np.array([GRAPH_CACHE_VERSION, self.VERSION]), nodes=self.nodes,
+                 **self.tables)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path, key):
+        """
+        Returns the landmarks saved at path, or None if there are none or they were built from other source files or
+        by another version
+        """
+        try:
+            with np.load(path) as data:
+                if str(data["key"]) != key or data["version"].tolist() != [GRAPH_CACHE_VERSION, cls.VERSION]:
+                    return None
+                return cls(data["nodes"], {name: data[name] for name in COST_FUNCTIONS})
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def heuristic(self, cost_function, goal):
+        """
+        Returns the landmark lower bound of the cost from every node to goal, as an array. Stored costs are rounded
+        down, so the cost subtracted is taken one float32 step up to keep the difference a lower bound. Landmarks that
+        don't reach goal or the node give no bound
+        """
+        low, high = self.low[cost_function], self.high[cost_function]
+        with np.errstate(invalid="ignore"):
+            bounds = np.maximum(low[:, goal, None] - high, low - high[:, goal, None])
+        bounds[~np.isfinite(bounds)] = 0
+        return np.maximum(bounds.max(axis=0), 0)
+
+
+def unit_vectors(latitude, longitude):
+    """
+    Returns the points on the unit sphere of latitudes and longitudes in degrees, as an (n, 3) array. The straight line
+    (chord) distance between 2 of them grows with the great circle distance, so a k-d tree over them finds the nearest
+    cities on the globe without trouble at the poles or the date line
+    """
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    return np.column_stack((np.cos(latitude) * np.cos(longitude), np.cos(latitude) * np.sin(longitude),
+                            np.sin(latitude)))
+
+
+def chord(miles):
+    return 2 * math.sin(min(miles / EARTH_RADIUS, math.pi) / 2)
+
+
+def arc_miles(chord_length):
+    return 2 * EARTH_RADIUS * math.asin(min(chord_length / 2, 1))
+
+
+class SpatialIndex:
+    """
+    A k-d tree over the nodes with GPS coordinates, for nearest city and radius queries in O(log n) instead of a scan.
+
+    The tree is implicit: points are reordered so that the node of the range lo .. hi-1 is the middle one, mid, with the
+    smaller points on the split axis in lo .. mid-1 and the larger ones in mid+1 .. hi-1. The split axis of each range
+    is the one along which its points spread the most
+    """
+
+    def __init__(self, nodes, points):
+        nodes, points = np.array(nodes), np.array(points, dtype=np.float64)
+        order = np.arange(len(nodes))
+        axes = np.zeros(len(nodes), dtype=np.int64)
+        ranges = [(0, len(nodes))]
+        while ranges:
+            lo, hi = ranges.pop()
+            if hi - lo < 1:
+                continue
+            mid = (lo + hi) // 2
+            chunk = points[order[lo:hi]]
+            axis = int(np.argmax(chunk.max(axis=0) - chunk.min(axis=0)))
+            order[lo:hi] = order[lo:hi][np.argpartition(chunk[:, axis], mid - lo)]
+            axes[mid] = axis
+            ranges += [(lo, mid), (mid + 1, hi)]
+        self.nodes = nodes[order].tolist()
+        self.points = [tuple(point) for point in points[order].tolist()]
+        self.axes = axes.tolist()
+
+    @classmethod
+    def from_graph(cls, graph):
+        nodes = np.flatnonzero(~np.isnan(graph.latitude))
+        return cls(nodes, unit_vectors(graph.latitude[nodes], graph.longitude[nodes]))
+
+    def search(self, point, count, radius):
+        """
+        Returns up to count (squared chord, node) pairs for the points nearest to point within chord length radius,
+        nearest first. Ranges whose split plane is farther than the current worst candidate are skipped
+        """
+        best = []       # max heap of (-squared chord, node)
+        limit = radius * radius
+        stack = [(0, len(self.nodes), 0.0)]
+        while stack:
+            lo, hi, bound = stack.pop()
+            if lo >= hi or bound > limit or (len(best) == count and bound >= -best[0][0]):
+                continue
+            mid = (lo + hi) // 2
+            x, y, z = self.points[mid]
+            squared = (point[0] - x) ** 2 + (point[1] - y) ** 2 + (point[2] - z) ** 2
+            if squared <= limit and (len(best) < count or squared < -best[0][0]):
+                heapq.heappush(best, (-squared, self.nodes[mid]))
+                if len(best) > count:
+                    heapq.heappop(best)
+            difference = point[self.axes[mid]] - self.points[mid][self.axes[mid]]
+            near, far = ((lo, mid), (mid + 1, hi)) if difference < 0 else ((mid + 1, hi), (lo, mid))
+            stack.append(far + (difference * difference,))
+            stack.append(near + (0.0,))
+        return sorted((-squared, node) for squared, node in best)
+
+    def nearest(self, latitude, longitude, count=1):
+        """
+        Returns the count nodes nearest to a point, as (node, great circle miles) pairs, nearest first
+        """
+        point = unit_vectors([latitude], [longitude])[0].tolist()
+        return [(node, arc_miles(math.sqrt(squared))) for squared, node in self.search(point, count, 2.0)]
+
+    def within(self, latitude, longitude, miles):
+        """
+        Returns the nodes within a great circle distance of a point, as (node, miles) pairs, nearest first
+        """
+        point = unit_vectors([latitude], [longitude])[0].tolist()
+        return [(node, arc_miles(math.sqrt(squared)))
+                for squared, node in self.search(point, len(self.nodes), chord(miles))]
+
+
+class Lexicographic(tuple):
+    """
+    A cost made of several cost functions compared in order - the second only breaks ties of the first, and so on.
+    Comparisons are those of tuples; adding two of them adds them element by element, so the same search loop that
+    adds up plain numbers adds these up too
+    """
+
+    def __add__(self, other):
+        return Lexicographic([a + b for a, b in zip(self, other)])
+
+    def zero(self):
+        return Lexicographic([0] * len(self))
+
+    def infinity(self):
+        return Lexicographic([math.inf] * len(self))
+
+
+class Router:
+    """
+    Answers route queries on a RoadGraph loaded once, with a contraction hierarchy when one is saved for the cost
+    function, else bidirectional Dijkstra for BIDIRECTIONAL_COSTS and A* for the others. Everything kept here is read
+    only after __init__ - the graph and the cost of every edge under each cost function - and the state of a search
+    (gscore, cameFrom, fringe) lives in dictionaries local to the search function, so queries can run back to back or
+    from several threads at once on the same Router.
+
+    Contraction hierarchies saved by route_tools.py are used for the cost functions that have one, unless
+    use_hierarchies is False, and saved landmarks sharpen the A* heuristic unless use_landmarks is False
+    """
+
+    def __init__(self, graph=None, use_hierarchies=True, use_landmarks=True):
+        self.graph = graph if graph is not None else RoadGraph.load()
+        self.index = self.graph.index
+        self.names = self.graph.names
+        self.offsets = self.graph.offsets.tolist()
+        self.targets = self.graph.targets.tolist()
+        self.distance = self.graph.distance.tolist()
+        self.speed = self.graph.speed.tolist()
+        self.highway = [self.graph.highways[h] for h in self.graph.highway.tolist()]
+        self.latitude = np.radians(self.graph.latitude)
+        self.longitude = np.radians(self.graph.longitude)
+        self.cos_latitude = np.cos(self.latitude)
+        self.located = np.array(self.graph.located, dtype=bool)
+        self.costs = {name: self.graph.edge_costs(name).tolist() for name in COST_FUNCTIONS}
+        self.gateway_tables = {}
+        self.spatial = None
+        self.hierarchies = {name: self.load_hierarchy(name) if use_hierarchies else None for name in COST_FUNCTIONS}
+        self.landmarks = None
+        if use_landmarks and self.graph.cache_dir is not None:
+            self.landmarks = Landmarks.load(Landmarks.path(self.graph), self.graph.key)
+        # the edge of the same road segment going the other way
+        order = np.argsort(self.graph.segment, kind="stable")
+        twin = np.empty(len(order), dtype=np.int64)
+        twin[order[0::2]], twin[order[1::2]] = order[1::2], order[0::2]
+        self.twin = twin.tolist()
+
+    def spatial_index(self):
+        """
+        The SpatialIndex of the graph's nodes with GPS coordinates, built on first use
+        """
+        if self.spatial is None:
+            self.spatial = SpatialIndex.from_graph(self.graph)
+        return self.spatial
+
+    def nearest_city(self, latitude, longitude):
+        """
+        Returns the name of the node with GPS coordinates nearest to a point
+        """
+        return self.names[self.spatial_index().nearest(latitude, longitude)[0][0]]
+
+    def route_between_points(self, start, end, cost):
+        """
+        Like route, for (latitude, longitude) points: each one is snapped to the nearest city, and the dictionary gets
+        "start-city" and "end-city" with the cities used
+        """
+        start_city, end_city = self.nearest_city(*start), self.nearest_city(*end)
+        answer = self.route(start_city, end_city, cost)
+        if answer != "":
+            answer = dict(answer, **{"start-city": start_city, "end-city": end_city})
+        return answer
+
+    def node(self, name):
+        if name not in self.index:
+            raise (Exception("Error: unknown city %s" % name))
+        return self.index[name]
+
+    def great_circle(self, goal):
+        """
+        Returns the great circle distance in miles from every node to goal, as an array (nan for nodes without GPS
+        coordinates). The coordinates are kept in radians with cos(latitude) precomputed, so this is one haversine over
+        all the nodes with the goal terms computed once
+        """
+        sin_latitude = np.sin((self.latitude - self.latitude[goal]) / 2)
+        sin_longitude = np.sin((self.longitude - self.longitude[goal]) / 2)
+        a = sin_latitude * sin_latitude + self.cos_latitude * self.cos_latitude[goal] * sin_longitude * sin_longitude
+        return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+    def gateways(self, cost_function):
+        """
+        RoadGraph.gateways for a cost function, built on first use
+        """
+        if cost_function not in self.gateway_tables:
+            self.gateway_tables[cost_function] = self.graph.gateways(self.costs[cost_function], self.located)
+        return self.gateway_tables[cost_function]
+
+    def heuristic(self, cost_function, goal, mode="auto"):
+        """
+        Returns the heuristic of a cost function towards goal for every node, as a list, computed with numpy when the
+        query starts. mode is "great-circle" (see great_circle_heuristic), "landmarks" - the larger of that and the
+        Landmarks bound, both being admissible - or "auto", landmarks when the Router has them
+        """
+        heuristic = self.great_circle_heuristic(cost_function, goal)
+        if mode == "landmarks" or (mode == "auto" and self.landmarks is not None):
+            if self.landmarks is None:
+                raise (Exception("Error: no landmarks, run python3 route_tools.py landmarks first"))
+            heuristic = np.maximum(heuristic, self.landmarks.heuristic(cost_function, goal))
+        elif mode not in ("auto", "great-circle"):
+            raise (Exception("Error: unknown heuristic %s" % mode))
+        return heuristic.tolist()
+
+    def edge_weights(self, weights):
+        """
+        Returns the weight of every edge, as a list, for a combination of cost functions:
+            - a dictionary {cost function: factor} weighs the edges by the sum of factor times their cost, in the units
+              of the get_route totals (so {"time": 1, "safe": 1000} puts an expected accident at 1000 hours)
+            - a sequence of cost functions makes them Lexicographic, compared in that order
+        """
+        if isinstance(weights, dict):
+            if any(name not in self.costs or factor < 0 for name, factor in weights.items()):
+                raise (Exception("Error: weights must be non negative factors of %s" % ", ".join(COST_FUNCTIONS)))
+            blend = np.zeros(len(self.targets))
+            for name, factor in weights.items():
+                blend += factor / (10 ** 6 if name == "safe" else 1) * self.graph.edge_costs(name)
+            return blend.tolist()
+        if not weights or any(name not in self.costs for name in weights):
+            raise (Exception("Error: a lexicographic cost needs cost functions among %s" % ", ".join(COST_FUNCTIONS)))
+        return [Lexicographic(costs) for costs in zip(*[self.costs[name] for name in weights])]
+
+    def weight_heuristic(self, weights, goal, mode="auto"):
+        """
+        The heuristic towards goal matching edge_weights - the same sum of factors times the heuristic of each cost
+        function, or the heuristics of the cost functions side by side. Each one never overestimates its own cost
+        function, so neither does the sum, and the Lexicographic bound never comes after the cost of the best route
+        """
+        if isinstance(weights, dict):
+            heuristic = np.zeros(len(self.names))
+            for name, factor in weights.items():
+                heuristic += factor / (10 ** 6 if name == "safe" else 1) * np.array(self.heuristic(name, goal, mode))
+            return heuristic.tolist()
+        return [Lexicographic(bounds) for bounds in zip(*[self.heuristic(name, goal, mode) for name in weights])]
+
+    def great_circle_heuristic(self, cost_function, goal):
+        """
+        Returns the great circle heuristic of a cost function towards goal for every node, as an array.
+
+        1. From a located node it is scale (see RoadGraph.locate) times the great circle distance to goal, which never
+           overestimates the cost of a route.
+        2. A route from an unlocated node (a junction without GPS, or a city with doubtful coordinates) leaves through
+           one of its gateways - the located nodes it reaches through unlocated nodes only - so the smallest cost to a
+           gateway plus the gateway's heuristic is a lower bound too, instead of 0.
+        3. When goal is unlocated, a route from a located node enters through one of the goal's gateways, so the bound
+           is the smallest scale * great circle distance to a gateway plus the cost from that gateway to goal.
+        4. The scale is taken 1e-9 smaller so rounding can't push a bound over the exact cost.
+        """
+        scale = self.graph.scales[cost_function] * (1 - 1e-9)
+        offsets, nodes, costs = self.gateways(cost_function)
+        heuristic = np.zeros(len(self.names))
+        if scale > 0 and self.located[goal]:
+            heuristic[self.located] = scale * self.great_circle(goal)[self.located]
+            starts = offsets[:-1][offsets[:-1] < offsets[1:]]
+            if len(starts):
+                heuristic[np.flatnonzero(offsets[:-1] < offsets[1:])] = np.minimum.reduceat(
+                    heuristic[nodes] + costs, starts)
+        elif scale > 0 and offsets[goal] < offsets[goal + 1]:
+            bounds = [scale * self.great_circle(gateway) + cost for gateway, cost in
+                      zip(nodes[offsets[goal]:offsets[goal + 1]].tolist(), costs[offsets[goal]:offsets[goal + 1]])]
+            heuristic[self.located] = np.min(bounds, axis=0)[self.located]
+        heuristic[goal] = 0
+        return heuristic
+
+    def load_hierarchy(self, cost_function):
+        if self.graph.cache_dir is None:
+            return None
+        return ContractionHierarchy.load(ContractionHierarchy.path(self.graph, cost_function), self.graph.key)
+
+    def route(self, start, end, cost):
+        """
+        Returns the get_route dictionary of the cheapest route from start to end under cost (segments, distance, time,
+        or safe for anything else)
+        """
+        cost = cost if cost in self.costs else "safe"
+        if self.hierarchies[cost] is not None:
+            return self.hierarchy_route(start, end, cost)
+        if cost in BIDIRECTIONAL_COSTS:
+            return findpathbidirectional(self, start, end, cost)
+        return findsmallestpath(self, start, end, cost)
+
+    def hierarchy_route(self, start, end, cost_function):
+        """
+        Answers a query with the contraction hierarchy of the cost function
+        """
+        start, end = self.node(start), self.node(end)
+        found = self.hierarchies[cost_function].query(start, end)
+        if found is None:
+            return ""
+        return summarizeRoute(self, [edge if forward else self.twin[edge] for edge, forward in found[1]])
+
+
+def build_hierarchies(graph=None, cost_functions=COST_FUNCTIONS):
+    """
+    Builds and saves the contraction hierarchy of each cost function next to the graph cache, where every Router made
+    afterwards picks them up. Returns {cost function: seconds taken}
+    """
+    graph = graph if graph is not None else RoadGraph.load()
+    os.makedirs(graph.cache_dir, exist_ok=True)
+    seconds = {}
+    for cost_function in cost_functions:
+        begin = time.perf_counter()
+        hierarchy = ContractionHierarchy.build(graph, graph.edge_costs(cost_function).tolist())
+        hierarchy.save(ContractionHierarchy.path(graph, cost_function), graph.key)
+        seconds[cost_function] = time.perf_counter() - begin
+    return seconds
+
+
+def build_landmarks(graph=None, count=Landmarks.COUNT):
+    """
+    Builds and saves the landmark tables next to the graph cache, where every Router made afterwards picks them up
+    """
+    graph = graph if graph is not None else RoadGraph.load()
+    os.makedirs(graph.cache_dir, exist_ok=True)
+    landmarks = Landmarks.build(graph, count)
+    landmarks.save(Landmarks.path(graph), graph.key)
+    return landmarks
+
+
+@functools.lru_cache(maxsize=None)
+def default_router():
+    """
+    The Router of the road network next to route.py, loaded on the first query
+    """
+    return Router()
+
+
+def one_to_many(router, source, targets, cost_function):
+    """
+    Returns the cost of the cheapest route from source to each of targets (node numbers), inf where there is none, in
+    the units of the get_route totals. It is one Dijkstra search, stopped as soon as every target is settled instead of
+    running over the whole graph
+    """
+    costs = router.graph.shortest_costs(router.costs[cost_function], source, targets)
+    unit = 10 ** 6 if cost_function == "safe" else 1
+    return (costs[list(targets)] / unit).tolist()
+
+
+def worker_context():
+    """
+    The multiprocessing context for pools of query workers: fork where the platform has it, so the workers start with
+    the Router the parent already loaded. Where it doesn't (Windows), workers are spawned and must load their own
+    Router, which pools do once per worker with default_router as their initializer
+    """
+    return multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+
+
+def matrix_row(task):
+    """
+    Computes one row of a distance_matrix in a worker process, on its default_router
+    """
+    row, source, targets, cost_function = task
+    return row, one_to_many(default_router(), source, targets, cost_function)
+
+
+def distance_matrix(sources, targets, cost, workers=None, output=None):
+    """
+    Returns the (sources, targets) numpy array of the cost of the cheapest route from every source city to every target
+    city, in the units of get_route (segments, miles, hours or expected accidents) and inf where there is no route.
+
+    1. Each row is one Dijkstra search from the source, stopped once all targets are settled (see one_to_many), rather
+       than len(targets) separate get_route searches.
+    2. Rows are spread over a pool of worker processes (one per CPU by default, workers=1 for none). The Router is
+       loaded before the pool starts and the workers are forked (see worker_context), so they share it instead of
+       loading the graph again - except where fork is missing, where each worker loads its own Router once.
+    3. With output, the array is also saved there as a .npy file (float64, rows in the order of sources), which
+       np.load(output, mmap_mode="r") maps without reading it all.
+    """
+    router = default_router()
+    cost = cost if cost in router.costs else "safe"
+    source_nodes = [router.node(name) for name in sources]
+    target_nodes = [router.node(name) for name in targets]
+    matrix = np.full((len(source_nodes), len(target_nodes)), np.inf)
+    tasks = [(row, source, target_nodes, cost) for row, source in enumerate(source_nodes)]
+    if workers == 1 or len(tasks) <= 1:
+        for row, values in map(matrix_row, tasks):
+            matrix[row] = values
+    else:
+        with worker_context().Pool(workers, initializer=default_router) as pool:
+            for row, values in pool.imap_unordered(matrix_row, tasks, chunksize=4):
+                matrix[row] = values
+    if output is not None:
+        np.save(output, matrix)
+    return matrix
+
+
+def reconstructPath(router, cameFrom, current, start):
+    """
+    Returns the get_route dictionary of the route to current, following cameFrom - the edge each node was reached by -
+    back to start. Each hop is a lookup rather than a scan of the node's roads, and where parallel roads join 2 cities
+    the route keeps the one the search actually took
+    """
+    edges = []
+    while current != start:
+        edges.append(cameFrom[current])
+        current = router.targets[router.twin[edges[-1]]]
+    return summarizeRoute(router, edges[::-1])
+
+
+def summarizeRoute(router, edges):
+    """
+    Returns the get_route dictionary of a route given as its road edges in order, with the totals added up in the same
+    pass that lists the steps
+    """
+    route = []
+    distance = 0
+    time = 0
+    accidents = 0
+    for edge in edges:
+        route.append((router.names[router.targets[edge]],
+                      "{0} for {1} miles".format(router.highway[edge], router.distance[edge])))
+        distance += router.distance[edge]
+        time += router.costs["time"][edge]
+        accidents += router.costs["safe"][edge]
+    return {"total-segments": len(edges),
+            "total-miles": float(distance),
+            "total-hours": time,
+            "total-expected-accidents": accidents/(10**6),
+            "route-taken": route}
+
+
+def get_route(start, end, cost):
+
+    """
+    Find shortest driving route between start city and end city based on a cost function.
+
+    1. Your function should return a dictionary having the following keys:
+        -"route-taken" : a list of pairs of the form (next-stop, segment-info), where
+           next-stop is a string giving the next stop in the route, and segment-info is a free-form
+           string containing information about the segment that will be displayed to the user.
+           (segment-info is not inspected by the automatic testing program).
+        -"total-segments": an integer indicating number of segments in the route-taken
+        -"total-miles": a float indicating total number of miles in the route-taken
+        -"total-hours": a float indicating total amount of time in the route-taken
+        -"total-expected-accidents": a float indicating the expected accident count on the route taken
+    2. Do not add any extra parameters to the get_route() function, or it will break our grading and testing code.
+    3. Please do not use any global variables, as it may cause the testing code to fail.
+    4. You can assume that all test cases will be solvable.
+    5. The current code just returns a dummy solution.
+    """
+
+    return default_router().route(start, end, cost)
+
+
+def spur_search(router, costs, heuristic, start, end, banned_nodes, banned_edges):
+    """
+    A* search from start to end that may not go through banned_nodes or along banned_edges. Returns (cost, edges) of
+    the cheapest route left, or None
+    """
+    offsets, targets = router.offsets, router.targets
+    gscore = {start: 0}
+    cameFrom = {start: None}
+    fringe = [(heuristic[start], 0, start)]
+    while fringe:
+        fscore, score, current = heapq.heappop(fringe)
+        if score > gscore[current]:
+            continue
+        if current == end:
+            edges = []
+            while cameFrom[current] is not None:
+                edges.append(cameFrom[current])
+                current = targets[router.twin[edges[-1]]]
+            return score, edges[::-1]
+        for edge in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[edge]
+            if neighbor in banned_nodes or edge in banned_edges:
+                continue
+            cost = score + costs[edge]
+            if cost < gscore.get(neighbor, math.inf):
+                gscore[neighbor] = cost
+                cameFrom[neighbor] = edge
+                heapq.heappush(fringe, (cost + heuristic[neighbor], cost, neighbor))
+    return None
+
+
+def findkroutes(router, start, end, cost_function, count=3, max_overlap=None):
+    """
+    Yen's algorithm for the count cheapest loopless routes from start to end, cheapest first, as get_route
+    dictionaries.
+
+    1. Every route after the first is found by following an accepted route up to a spur node and leaving it there:
+       the spur search may not reuse the root nodes before the spur node, nor any edge out of the spur node that an
+       accepted route with the same root already takes. Candidates wait in a heap by cost.
+    2. All the spur searches share one piece of state - the exact cost from every node to end, from a single Dijkstra
+       search backwards from end. Bans only make routes more expensive, so it stays an admissible heuristic, and with
+       it A* walks almost straight to end, expanding little more than the nodes of the route it returns.
+    3. With max_overlap (0 - 1), a candidate is skipped when more than that share of its miles runs along road segments
+       of routes already accepted, so the routes returned are real alternatives rather than small detours off the
+       first one.
+    """
+    start, end = router.node(start), router.node(end)
+    costs = router.costs[cost_function]
+    heuristic = router.graph.shortest_costs(costs, end).tolist()
+    if count < 1 or math.isinf(heuristic[start]):
+        return []
+    first = spur_search(router, costs, heuristic, start, end, set(), set())
+    accepted, candidates, seen = [first], [], {tuple(first[1])}
+    last = first
+    while len(accepted) < count:
+        if last is not None:
+            nodes = [start] + [router.targets[edge] for edge in last[1]]
+            for i in range(len(last[1])):
+                root = last[1][:i]
+                banned_edges = {route[1][i] for route in accepted if route[1][:i] == root}
+                spur = spur_search(router, costs, heuristic, nodes[i], end, set(nodes[:i]), banned_edges)
+                if spur is not None:
+                    edges = root + spur[1]
+                    if tuple(edges) not in seen:
+                        seen.add(tuple(edges))
+                        heapq.heappush(candidates, (sum(costs[edge] for edge in edges), edges))
+        if not candidates:
+            break
+        cost, edges = heapq.heappop(candidates)
+        last = None
+        if max_overlap is not None:
+            taken = {router.graph.segment[edge] for route in accepted for edge in route[1]}
+            shared = sum(router.distance[edge] for edge in edges if router.graph.segment[edge] in taken)
+            if shared > max_overlap * sum(router.distance[edge] for edge in edges):
+                continue
+        last = (cost, edges)
+        accepted.append(last)
+    return [summarizeRoute(router, edges) for cost, edges in accepted]
+
+
+def get_routes(start, end, cost, count=3, max_overlap=None):
+    """
+    Returns up to count distinct routes from start to end, cheapest first, in the get_route format - see findkroutes
+    """
+    router = default_router()
+    return findkroutes(router, start, end, cost if cost in router.costs else "safe", count, max_overlap)
+
+
+def get_route_between_points(start, end, cost):
+    """
+    get_route for points given as (latitude, longitude) instead of city names. Both are snapped to the nearest city
+    with GPS coordinates (see SpatialIndex), which are added to the answer as "start-city" and "end-city"
+    """
+    return default_router().route_between_points(start, end, cost)
+
+
+def findsmallestpath(router, start, end, cost_function, heuristic="auto"):
+    """
+    A* search from start to end under one of the cost functions, with the Router's heuristic in the given mode - see
+    findweightedpath
+    """
+    goal = router.node(end)
+    return findweightedpath(router, start, end, router.costs[cost_function],
+                            router.heuristic(cost_function, goal, heuristic))
+
+
+def findweightedpath(router, start, end, weights, heuristic=None):
+    """
+    A* search from start to end on the graph of a Router, for any per edge weights - the costs of a cost function, or
+    Router.edge_weights of a blend of them or of a Lexicographic order. heuristic is a list with a bound for every node
+    (Router.heuristic, Router.weight_heuristic), None for none.
+
+    1. The fringe is a heap of (fscore, gscore, node) with fscore = gscore + hscore, the cost to reach the node plus its
+       heuristic, which never overestimates the remaining cost.
+    2. A node whose gscore improves is pushed again instead of being moved in the heap (decrease-key by reinsertion);
+       the entries left behind are skipped when popped, since their gscore is no longer the node's best.
+    3. There is no closed set - a node reached again more cheaply is simply pushed again and expanded again, so the
+       route is the cheapest one even where the heuristic isn't consistent (next to junctions without GPS).
+    4. The search stops when the goal is popped: with an admissible heuristic every route still in the fringe costs at
+       least as much.
+    5. The search state (gscore, cameFrom, fringe) is local to the query. cameFrom keeps the edge each node was reached
+       by, so reconstructPath knows which road was taken.
+    6. The loop only adds and compares weights, so it is the same whatever they are made of.
+    """
+    start, end = router.node(start), router.node(end)
+    zero, infinity = 0, math.inf
+    if isinstance(weights[0], Lexicographic):
+        zero, infinity = weights[0].zero(), weights[0].infinity()
+    heuristic = heuristic if heuristic is not None else [zero] * len(router.names)
+    offsets, targets = router.offsets, router.targets
+    gscore = {start: zero}
+    cameFrom = {}
+    fringe = [(heuristic[start], zero, start)]
+
+    while fringe:
+        fscore, score, current = heapq.heappop(fringe)
+        if score > gscore[current]:
+            continue
+        if current == end:
+            return reconstructPath(router, cameFrom, current, start)
+        for edge in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[edge]
+            cost = score + weights[edge]
+            if cost < gscore.get(neighbor, infinity):
+                gscore[neighbor] = cost
+                cameFrom[neighbor] = edge
+                heapq.heappush(fringe, (cost + heuristic[neighbor], cost, neighbor))
+    return ""
+
+
+class ParetoFront:
+    """
+    The (first, second) costs no other one in the front matches or beats on both, with a label each. They are kept
+    sorted by first cost, so their second costs go down, and both the test for a beaten pair and the removal of the
+    pairs a new one beats are a bisection
+    """
+
+    def __init__(self):
+        self.firsts = []
+        self.seconds = []
+        self.labels = []
+
+    def beats(self, first, second):
+        i = bisect.bisect_right(self.firsts, first)
+        return i > 0 and self.seconds[i - 1] <= second
+
+    def add(self, first, second, label):
+        """
+        Adds a pair that isn't beaten, returning the labels of the pairs it beats, which leave the front
+        """
+        i = j = bisect.bisect_left(self.firsts, first)
+        while j < len(self.seconds) and self.seconds[j] >= second:
+            j += 1
+        beaten = self.labels[i:j]
+        self.firsts[i:j], self.seconds[i:j], self.labels[i:j] = [first], [second], [label]
+        return beaten
+
+
+def findparetoroutes(router, start, end, criteria=("time", "safe"), heuristic="auto"):
+    """
+    Returns the Pareto front of routes from start to end under 2 cost functions - every route that no other route
+    beats on one of them without losing on the other - as get_route dictionaries ordered by the first one.
+
+    1. This is a bi-objective A* (NAMOA* for 2 criteria): a label is a partial route with its 2 costs, and each node
+       keeps a ParetoFront of the labels that no other label at the node matches or beats on both. Labels leave a heap
+       in lexicographic order of cost plus heuristic.
+    2. A label is dropped when a route already found to end matches or beats its cost plus heuristic on both, since
+       each heuristic never overestimates its cost function, so no route through the label can do better.
+    3. Routes with the same 2 costs are reported once.
+    """
+    if len(criteria) != 2 or any(name not in router.costs for name in criteria):
+        raise (Exception("Error: a Pareto front needs 2 cost functions among %s" % ", ".join(COST_FUNCTIONS)))
+    start, end = router.node(start), router.node(end)
+    first_costs, second_costs = (router.costs[name] for name in criteria)
+    first_heuristic, second_heuristic = (router.heuristic(name, end, heuristic) for name in criteria)
+    offsets, targets = router.offsets, router.targets
+    labels = [(0, 0, start, None, None)]        # (first cost, second cost, node, edge, label it extends)
+    alive = [True]
+    fronts = collections.defaultdict(ParetoFront)
+    fronts[start].add(0, 0, 0)
+    goals = ParetoFront()
+    fringe = [(first_heuristic[start], second_heuristic[start], 0)]
+
+    while fringe:
+        first_estimate, second_estimate, label = heapq.heappop(fringe)
+        if not alive[label] or goals.beats(first_estimate, second_estimate):
+            continue
+        first, second, current = labels[label][:3]
+        if current == end:
+            goals.add(first, second, label)
+            continue
+        for edge in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[edge]
+            next_first, next_second = first + first_costs[edge], second + second_costs[edge]
+            first_estimate = next_first + first_heuristic[neighbor]
+            second_estimate = next_second + second_heuristic[neighbor]
+            if fronts[neighbor].beats(next_first, next_second) or goals.beats(first_estimate, second_estimate):
+                continue
+            for other in fronts[neighbor].add(next_first, next_second, len(labels)):
+                alive[other] = False
+            labels.append((next_first, next_second, neighbor, edge, label))
+            alive.append(True)
+            heapq.heappush(fringe, (first_estimate, second_estimate, len(labels) - 1))
+
+    routes = []
+    for label in goals.labels:
+        edges = []
+        while labels[label][3] is not None:
+            edges.append(labels[label][3])
+            label = labels[label][4]
+        routes.append(summarizeRoute(router, edges[::-1]))
+    return routes
+
+
+def get_weighted_route(start, end, weights):
+    """
+    Returns the get_route dictionary of the cheapest route from start to end under a blend of cost functions
+    ({cost function: factor}) or a lexicographic order of them - see Router.edge_weights
+    """
+    router = default_router()
+    return findweightedpath(router, start, end, router.edge_weights(weights),
+                            router.weight_heuristic(weights, router.node(end)))
+
+
+def get_pareto_routes(start, end, criteria=("time", "safe")):
+    """
+    Returns the routes from start to end that no other route beats on both criteria - see findparetoroutes
+    """
+    return findparetoroutes(default_router(), start, end, criteria)
+
+
+def findpathbidirectional(router, start, end, cost_function):
+    """
+    Bidirectional Dijkstra search between start and end - for segments and safe, where the heuristics are too weak to
+    steer A*, so that the search explores 2 balls of about half the radius instead of 1 around start.
+
+    1. One search goes forward from start and one backward from end (roads go both ways, so the backward search runs on
+       the same edges). Each step expands the side whose fringe has the smaller key.
+    2. Every edge relaxed into a node the other side has reached gives a route through it; best is the cheapest one.
+    3. The search stops when the two smallest keys add up to at least best: any route not yet found would have to go
+       through a node unsettled on both sides, and so cost at least that much.
+    4. Every node keeps the edge it was reached by, so the route is read off the two trees edge by edge.
+    """
+    start, end = router.node(start), router.node(end)
+    costs = router.costs[cost_function]
+    offsets, targets, twin = router.offsets, router.targets, router.twin
+    gscores = ({start: 0}, {end: 0})
+    parents = ({start: None}, {end: None})      # node -> edge it was reached by, in the direction of its search
+    settled = (set(), set())
+    fringes = ([(0, start)], [(0, end)])
+    best, meeting = (0, start) if start == end else (math.inf, None)
+    while fringes[0] and fringes[1] and fringes[0][0][0] + fringes[1][0][0] < best:
+        side = 0 if fringes[0][0][0] <= fringes[1][0][0] else 1
+        score, current = heapq.heappop(fringes[side])
+        if current in settled[side]:
+            continue
+        settled[side].add(current)
+        gscore, other = gscores[side], gscores[1 - side]
+        for edge in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[edge]
+            if score + costs[edge] < gscore.get(neighbor, math.inf):
+                gscore[neighbor] = score + costs[edge]
+                parents[side][neighbor] = edge
+                heapq.heappush(fringes[side], (score + costs[edge], neighbor))
+                if neighbor in other and gscore[neighbor] + other[neighbor] < best:
+                    best, meeting = gscore[neighbor] + other[neighbor], neighbor
+    if meeting is None:
+        return ""
+    forward, node = [], meeting
+    while parents[0][node] is not None:
+        forward.append(parents[0][node])
+        node = targets[twin[parents[0][node]]]
+    backward, node = [], meeting
+    while parents[1][node] is not None:
+        backward.append(twin[parents[1][node]])
+        node = targets[backward[-1]]
+    return summarizeRoute(router, forward[::-1] + backward)
+
+
+
+    #    route_taken = [("Martinsville,_Indiana","IN_37 for 19 miles"),
+    #                   ("Jct_I-465_&_IN_37_S,_Indiana","IN_37 for 25 miles"),
+    #                   ("Indianapolis,_Indiana","IN_37 for 7 miles")]
+
+    #    return {"total-segments" : len(route_taken),
+    #            "total-miles" : 51,
+    #            "total-hours" : 1.07949,
+    #            "total-expected-accidents" : 0.000051,
+    #            "route-taken" : route_taken}
+
+
+# Please don't modify anything below this line
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        raise(Exception("Error: expected 3 arguments"))
+
+    (_, start_city, end_city, cost_function) = sys.argv
+    if cost_function not in ("segments", "distance", "time", "safe"):
+        raise(Exception("Error: invalid cost function"))
+
+    result = get_route(start_city, end_city, cost_function)
+
+    # Pretty print the route
+    print("Start in %s" % start_city)
+    for step in result["route-taken"]:
+        print("  Then go to %s via %s" % step)
+
+    print("\n Total segments: %6d" % result["total-segments"])
+    print("    Total miles: %10.3f" % result["total-miles"])
+    print("    Total hours: %10.3f" % result["total-hours"])
+    print("Total accidents: %15.8f" % result["total-expected-accidents"])
+
+
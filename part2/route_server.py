@@ -0,0 +1,348 @@
+#!/usr/local/bin/python3
+# route_server.py : A local server answering get_route queries from one loaded road graph
+#
+# Every run of route.py pays for starting python and loading the graph before it answers a single query. This server
+# loads the Router once, hands the searches to a pool of worker processes forked from it (so they share the loaded
+# graph instead of loading it again - where fork is missing, each worker loads its own), and keeps the answers of
+# recent (start, end, cost) queries in an LRU cache.
+#
+# python3 route_server.py                               # listen on 127.0.0.1:8765, one worker per CPU
+# python3 route_server.py --port 9000 --workers 2 --cache 10000
+#
+# It speaks HTTP and JSON lines on the same port:
+#   curl 'http://127.0.0.1:8765/route?start=Bloomington,_Indiana&end=Chicago,_Illinois&cost=time'
+#   curl -d '{"start": "Bloomington,_Indiana", "end": "Chicago,_Illinois", "cost": "time"}' http://127.0.0.1:8765/route
+#   curl http://127.0.0.1:8765/stats                     # query counts, cache hits and latency histograms
+#   echo '{"start": "Bloomington,_Indiana", "end": "Chicago,_Illinois", "cost": "time"}' | nc 127.0.0.1 8765
+#
+# A JSON lines connection gets one JSON line back per query line, in the same order. Answers are the get_route
+# dictionaries, and {"error": message} for bad queries.
+#
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import collections
+import urllib.parse
+import concurrent.futures
+import route
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)   # upper bounds in milliseconds
+HTTP_METHODS = (b"GET ", b"POST ", b"HEAD ")
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+MAX_BODY = 64 * 1024            # bytes of a POST body or query line, far more than any query needs
+
+
+class LatencyHistogram:
+    """
+    Counts latencies in the LATENCY_BUCKETS (the last bucket takes everything slower), with their total and maximum
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds):
+        milliseconds = seconds * 1000
+        bucket = 0
+        while bucket < len(LATENCY_BUCKETS) and milliseconds > LATENCY_BUCKETS[bucket]:
+            bucket += 1
+        self.counts[bucket] += 1
+        self.total += milliseconds
+        self.maximum = max(self.maximum, milliseconds)
+
+    def quantile(self, fraction):
+        """
+        Upper bound of the bucket holding the given fraction of the latencies (the maximum for the last bucket)
+        """
+        needed = fraction * sum(self.counts)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= needed:
+                return LATENCY_BUCKETS[bucket] if bucket < len(LATENCY_BUCKETS) else self.maximum
+        return 0.0
+
+    def as_dict(self):
+        count = sum(self.counts)
+        labels = ["<=%gms" % bound for bound in LATENCY_BUCKETS] + [">%gms" % LATENCY_BUCKETS[-1]]
+        return {"count": count,
+                "mean-ms": self.total / count if count else 0.0,
+                "max-ms": self.maximum,
+                "p50-ms": self.quantile(0.5),
+                "p99-ms": self.quantile(0.99),
+                "buckets": dict(zip(labels, self.counts))}
+
+
+class LineTooLong(ValueError):
+    """
+    A line over MAX_BODY bytes, whose rest has been skipped. head holds its first bytes
+    """
+
+    def __init__(self, head):
+        super().__init__("line over %d bytes" % MAX_BODY)
+        self.head = head
+
+
+async def read_line(reader):
+    """
+    Returns the next line like reader.readline (b"" at the end of the stream), or a LineTooLong - returned, not raised,
+    so a JSON lines connection can answer it and go on with the next line
+    """
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as error:
+        return error.partial
+    except asyncio.LimitOverrunError:
+        too_long = LineTooLong(await reader.read(16))     # enough to tell an HTTP request line
+    while True:
+        try:
+            await reader.readuntil(b"\n")
+            return too_long
+        except asyncio.IncompleteReadError:
+            return too_long
+        except asyncio.LimitOverrunError as error:
+            await reader.readexactly(error.consumed)
+
+
+def answer(start, end, cost):
+    """
+    Runs in a worker process, on its default_router - the one the server loaded before forking the pool, or one the
+    worker loaded itself where fork is missing (see route.worker_context)
+    """
+    return route.get_route(start, end, cost)
+
+
+class RouteServer:
+    """
+    Answers get_route queries over HTTP and JSON lines.
+
+    1. The Router is loaded and the worker pool started before the server listens. Where the platform has fork the
+       workers are forked, inherit the Router and never load the graph; elsewhere each one loads its own Router once,
+       when it starts (see route.worker_context).
+    2. Answers are kept in an LRU cache of cache_size (start, end, cost) queries. Queries already being searched are not
+       searched again - later ones wait for the same result.
+    3. Latencies are recorded per cost function, from the query arriving to its answer being ready, and split into
+       cache hits and searches; /stats returns them as histograms.
+    """
+
+    def __init__(self, workers=None, cache_size=4096):
+        self.router = route.default_router()
+        self.executor = concurrent.futures.ProcessPoolExecutor(workers, mp_context=route.worker_context(),
+                                                               initializer=route.default_router)
+        # a forking pool starts all its workers on the first submit - do it now, before there are sockets for them to
+        # inherit (a worker holding a copy of a connection keeps it open after the server closes it)
+        self.executor.submit(int).result()
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.pending = {}
+        self.counters = collections.Counter()
+        self.latency = collections.defaultdict(LatencyHistogram)
+        self.started = time.time()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def check(self, query):
+        """
+        Returns the (start, end, cost) key of a query dictionary, raising ValueError for bad ones. Unknown cost
+        functions become safe as in get_route
+        """
+        if not isinstance(query, dict) or not isinstance(query.get("start"), str) or \
+                not isinstance(query.get("end"), str):
+            raise ValueError("a query needs start and end cities")
+        for name in (query["start"], query["end"]):
+            if name not in self.router.index:
+                raise ValueError("unknown city %s" % name)
+        cost = query.get("cost")
+        return query["start"], query["end"], cost if cost in route.COST_FUNCTIONS else "safe"
+
+    async def query(self, query):
+        """
+        Returns the get_route dictionary for a query dictionary with start, end and cost
+        """
+        begin = time.perf_counter()
+        key = self.check(query)
+        self.counters["queries"] += 1
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.counters["cache-hits"] += 1
+            self.latency["cached"].record(time.perf_counter() - begin)
+            return self.cache[key]
+        if key not in self.pending:
+            self.counters["searches"] += 1
+            future = asyncio.get_running_loop().run_in_executor(self.executor, answer, *key)
+            future.add_done_callback(lambda done: self.pending.pop(key, None))
+            self.pending[key] = future
+        result = await asyncio.shield(self.pending[key])
+        self.cache[key] = result
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        self.latency[key[2]].record(time.perf_counter() - begin)
+        return result
+
+    def stats(self):
+        return {"uptime-seconds": time.time() - self.started,
+                "queries": self.counters["queries"],
+                "searches": self.counters["searches"],
+                "cache-hits": self.counters["cache-hits"],
+                "errors": self.counters["errors"],
+                "cached-queries": len(self.cache),
+                "latency": {name: histogram.as_dict() for name, histogram in sorted(self.latency.items())}}
+
+    async def respond(self, query):
+        """
+        Returns the answer to a query (a dictionary, or a JSON object as bytes), or {"error": message} for a query that
+        failed
+        """
+        try:
+            return await self.query(json.loads(query) if isinstance(query, bytes) else query)
+        except Exception as error:
+            return await self.refuse(error)
+
+    async def refuse(self, error):
+        self.counters["errors"] += 1
+        return {"error": str(error)}
+
+    async def handle(self, reader, writer):
+        """
+        One connection - HTTP if it starts with an HTTP method, JSON lines otherwise
+        """
+        try:
+            line = await read_line(reader)
+            if (line.head if isinstance(line, LineTooLong) else line).startswith(HTTP_METHODS):
+                await self.handle_http(line, reader, writer)
+            else:
+                await self.handle_lines(line, reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_lines(self, line, reader, writer):
+        """
+        Answers one query per line. Queries run concurrently, answers are written back in the order of the queries.
+        Lines over MAX_BODY bytes get {"error": message}, as does a connection failing while its queries are read
+        """
+        answers = asyncio.Queue()
+
+        async def write_answers():
+            while True:
+                task = await answers.get()
+                if task is None:
+                    return
+                writer.write(json.dumps(await task).encode() + b"\n")
+                await writer.drain()
+
+        writing = asyncio.ensure_future(write_answers())
+        try:
+            while line:
+                if isinstance(line, LineTooLong):
+                    await answers.put(asyncio.ensure_future(self.refuse(line)))
+                elif line.strip():
+                    await answers.put(asyncio.ensure_future(self.respond(line)))
+                line = await read_line(reader)
+        except ConnectionError as error:
+            await answers.put(asyncio.ensure_future(self.refuse(error)))
+        await answers.put(None)
+        await writing
+
+    async def read_request(self, request_line, reader):
+        """
+        Reads the rest of an HTTP request, returning its (method, target, body). Raises ValueError for a malformed
+        request line or Content-Length, for lines and bodies over MAX_BODY and for bodies shorter than their
+        Content-Length
+        """
+        if isinstance(request_line, LineTooLong):
+            raise request_line
+        fields = request_line.decode("latin-1").split()
+        if len(fields) < 2:
+            raise ValueError("malformed request line")
+        method, target = fields[:2]
+        length = 0
+        while True:
+            header = await read_line(reader)
+            if isinstance(header, LineTooLong):
+                raise header
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                if not value.strip().isdigit():
+                    raise ValueError("malformed Content-Length")
+                length = int(value.strip())
+        if length > MAX_BODY:
+            raise ValueError("request body over %d bytes" % MAX_BODY)
+        try:
+            return method, target, await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise ValueError("request body shorter than its Content-Length")
+
+    async def handle_http(self, request_line, reader, writer):
+        """
+        Answers one HTTP request: GET /route?start=..&end=..&cost=.., POST /route with a JSON query, or GET /stats.
+        Malformed requests get a 400 with {"error": message}
+        """
+        try:
+            method, target, body = await self.read_request(request_line, reader)
+        except ValueError as error:
+            return await self.write_response(writer, "GET", 400, await self.refuse(error))
+        path, _, query_string = target.partition("?")
+        status = 200
+        if path == "/stats":
+            result = self.stats()
+        elif path != "/route":
+            status, result = 404, {"error": "unknown path %s" % path}
+        elif method == "POST":
+            result = await self.respond(body)
+        elif method == "GET":
+            result = await self.respond(dict(urllib.parse.parse_qsl(query_string)))
+        else:
+            status, result = 405, {"error": "use GET or POST"}
+        if status == 200 and "error" in result:
+            status = 400
+        await self.write_response(writer, method, status, result)
+
+    async def write_response(self, writer, method, status, result):
+        content = json.dumps(result).encode()
+        writer.write(("HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+                      "Connection: close\r\n\r\n" % (status, HTTP_REASONS[status], len(content))).encode())
+        if method != "HEAD":
+            writer.write(content)
+        await writer.drain()
+
+    async def serve(self, host="127.0.0.1", port=8765, ready=None):
+        """
+        Serves until cancelled. ready (a callable) is given the bound (host, port) once the server is listening
+        """
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_BODY)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[:2])
+        async with server:
+            await server.serve_forever()
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Serve get_route queries over HTTP and JSON lines")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, one per CPU by default")
+    parser.add_argument("--cache", type=int, default=4096, help="number of recent queries whose answers are kept")
+    options = parser.parse_args(arguments)
+    server = RouteServer(options.workers, options.cache)
+    try:
+        asyncio.run(server.serve(options.host, options.port,
+                                 ready=lambda address: print("Serving routes on %s:%d" % address, flush=True)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,74 @@
+#!/usr/local/bin/python3
+# route_tools.py : Offline preprocessing for route.py
+#
+# The route.py command line must stay as it is, so the preprocessing steps live here. Their results are saved in
+# part2/graph-cache/ next to the cached road graph, and every later get_route() picks them up.
+#
+# python3 route_tools.py hierarchies                    # contraction hierarchies for all 4 cost functions
+# python3 route_tools.py hierarchies --costs time       # ... or just some of them
+# python3 route_tools.py landmarks                      # landmark tables for the A* heuristic
+# python3 route_tools.py matrix depots.txt time         # travel times between the cities listed in depots.txt
+# python3 route_tools.py matrix depots.txt distance --targets stores.txt --output miles.npy
+#
+# City lists have one city per line. A matrix is printed as tab separated values unless --output names a .npy file.
+#
+
+import sys
+import time
+import argparse
+import route
+
+
+def hierarchies(options):
+    seconds = route.build_hierarchies(cost_functions=options.costs)
+    for cost_function, taken in seconds.items():
+        print("%-9s contraction hierarchy built in %.1fs" % (cost_function, taken))
+    return 0
+
+
+def landmarks(options):
+    begin = time.perf_counter()
+    built = route.build_landmarks(count=options.count)
+    print("%d landmarks built in %.1fs: %s" % (len(built.nodes), time.perf_counter() - begin,
+                                              ", ".join(route.RoadGraph.load().names[node] for node in built.nodes)))
+    return 0
+
+
+def read_cities(path):
+    with open(path) as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def matrix(options):
+    sources = read_cities(options.sources)
+    targets = read_cities(options.targets) if options.targets else sources
+    values = route.distance_matrix(sources, targets, options.cost, options.workers, options.output)
+    if options.output is None:
+        print("\t".join([""] + targets))
+        for source, row in zip(sources, values.tolist()):
+            print("\t".join([source] + ["%g" % value for value in row]))
+    return 0
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Preprocessing for the route.py road network")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("hierarchies", help="build the contraction hierarchies used by get_route")
+    command.add_argument("--costs", nargs="+", choices=route.COST_FUNCTIONS, default=list(route.COST_FUNCTIONS))
+    command.set_defaults(run=hierarchies)
+    command = commands.add_parser("landmarks", help="pick landmarks and store their cost tables for A*")
+    command.add_argument("--count", type=int, default=route.Landmarks.COUNT)
+    command.set_defaults(run=landmarks)
+    command = commands.add_parser("matrix", help="costs of the cheapest routes between lists of cities")
+    command.add_argument("sources", help="file with one source city per line")
+    command.add_argument("cost", choices=route.COST_FUNCTIONS)
+    command.add_argument("--targets", default=None, help="file with one target city per line (default: the sources)")
+    command.add_argument("--workers", type=int, default=None, help="worker processes, one per CPU by default")
+    command.add_argument("--output", default=None, help="save the matrix to this .npy file instead of printing it")
+    command.set_defaults(run=matrix)
+    options = parser.parse_args(arguments)
+    return options.run(options)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,416 @@
+# test_route_engines.py : checks for the graph loader and search engines of route.py
+#
+# Run from part2: python3 -m pytest -v test_route_engines.py
+
+import os
+import json
+import math
+import queue
+import random
+import shutil
+import socket
+import asyncio
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import concurrent.futures
+import numpy as np
+import route
+import route_server
+import pytest
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """A copy of the data files, so the cache can be invalidated without touching the real ones"""
+    for name in route.GRAPH_SOURCES:
+        shutil.copy(os.path.join(route.DATA_DIR, name), tmp_path / name)
+    return str(tmp_path)
+
+
+TOTALS = {"segments": "total-segments", "distance": "total-miles", "time": "total-hours",
+          "safe": "total-expected-accidents"}
+
+
+def dijkstra(router, start, costs):
+    """Cheapest cost from start to every node it reaches"""
+    return router.graph.dijkstra(costs, start)
+
+
+def cost_total(cost):
+    """The total of a get_route answer under a cost function, in the units of router.costs"""
+    scale = 10 ** 6 if cost == "safe" else 1
+    return lambda answer: answer[TOTALS[cost]] * scale
+
+
+def assert_cheapest(router, answer, start, end, costs, total):
+    """Checks that answer is a cheapest route from start to end under costs ("" if none), total giving its cost"""
+    best = dijkstra(router, router.index[start], costs).get(router.index[end])
+    if best is None:
+        assert answer == ""
+    else:
+        assert total(answer) == pytest.approx(best), "Not the cheapest route!"
+
+
+def random_pairs(router, count, seed):
+    rng = random.Random(seed)
+    return [(rng.choice(router.names), rng.choice(router.names)) for _ in range(count)]
+
+
+def same_graph(a, b):
+    return a.names == b.names and a.highways == b.highways and all(
+        np.array_equal(getattr(a, name), getattr(b, name), equal_nan=True) for name in route.RoadGraph.ARRAYS)
+
+
+def test_cached_graph_matches_parsed_graph(data_dir):
+    parsed = route.RoadGraph.load(data_dir)
+    cached = route.RoadGraph.load(data_dir)
+    assert isinstance(cached.targets, np.memmap), "Second load should come from the cache"
+    assert same_graph(parsed, cached)
+    assert len(parsed.targets) == 2 * sum(1 for _ in open(os.path.join(data_dir, "road-segments.txt")))
+
+
+def test_graph_edges_match_segments(data_dir):
+    graph = route.RoadGraph.load(data_dir)
+    start = graph.index["Bloomington,_Indiana"]
+    ends = {graph.names[graph.targets[edge]]: int(graph.distance[edge]) for edge in graph.edges(start)}
+    assert ends["Martinsville,_Indiana"] == 19
+
+
+def test_cache_is_rebuilt_when_a_source_changes(data_dir, monkeypatch):
+    route.RoadGraph.load(data_dir)
+    with open(os.path.join(data_dir, "road-segments.txt"), "a") as file:
+        file.write("Nowhere,_Indiana Bloomington,_Indiana 7 30 IN_999\n")
+    graph = route.RoadGraph.load(data_dir)
+    assert "Nowhere,_Indiana" in graph.index and not isinstance(graph.targets, np.memmap)
+
+    os.utime(os.path.join(data_dir, "city-gps.txt"))        # touched but unchanged, the hash still matches
+    monkeypatch.setattr(route.RoadGraph, "parse", classmethod(lambda cls, data_dir: pytest.fail("parsed again")))
+    assert "Nowhere,_Indiana" in route.RoadGraph.load(data_dir).index
+
+
+def test_router_answers_queries_from_several_threads():
+    router = route.Router()
+    queries = [(start, end, cost) for start, end in [("Bloomington,_Indiana", "Indianapolis,_Indiana"),
+                                                    ("Chicago,_Illinois", "Bloomington,_Indiana"),
+                                                    ("Indianapolis,_Indiana", "Louisville,_Kentucky")]
+               for cost in ("segments", "distance", "time", "safe")]
+    expected = [router.route(*query) for query in queries]
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        assert list(pool.map(lambda query: router.route(*query), queries * 3)) == expected * 3
+    assert route.get_route(*queries[0]) == expected[0]
+
+
+def test_router_rejects_unknown_cities():
+    with pytest.raises(Exception, match="unknown city"):
+        route.default_router().route("Atlantis,_Indiana", "Bloomington,_Indiana", "distance")
+
+
+@pytest.mark.parametrize("cost", route.COST_FUNCTIONS)
+def test_findsmallestpath_is_optimal(cost):
+    router = route.Router(use_hierarchies=False)
+    for start, end in random_pairs(router, 15, 7):
+        assert_cheapest(router, router.route(start, end, cost), start, end, router.costs[cost], cost_total(cost))
+
+
+@pytest.mark.parametrize("cost", route.COST_FUNCTIONS)
+def test_heuristic_is_admissible(cost):
+    router = route.default_router()
+    unlocated = np.flatnonzero(~router.located)
+    goals = [router.index[end] for start, end in random_pairs(router, 4, 3)] + unlocated[::400].tolist()
+    for goal in goals:
+        heuristic = router.heuristic(cost, goal)
+        for node, best in dijkstra(router, goal, router.costs[cost]).items():
+            assert heuristic[node] <= best, "Heuristic overestimates from %s" % router.names[node]
+        assert any(heuristic[node] > 0 for node in unlocated if node != goal) or not router.located[goal]
+
+
+@pytest.fixture(scope="module")
+def hierarchies():
+    router = route.Router(use_hierarchies=False)
+    return router, {cost: route.ContractionHierarchy.build(router.graph, router.costs[cost])
+                    for cost in ("segments", "time")}
+
+
+@pytest.mark.parametrize("cost", ["segments", "time"])
+def test_contraction_hierarchy_is_optimal(hierarchies, cost):
+    router, built = hierarchies
+    router.hierarchies = dict(router.hierarchies, **{cost: built[cost]})
+    for start, end in random_pairs(router, 30, 11):
+        answer = router.route(start, end, cost)
+        assert_cheapest(router, answer, start, end, router.costs[cost], cost_total(cost))
+        if answer:
+            assert len(answer["route-taken"]) == answer["total-segments"]
+            assert start == end or answer["route-taken"][-1][0] == end
+
+
+def test_contraction_hierarchy_is_saved_for_its_sources(hierarchies, tmp_path):
+    router, built = hierarchies
+    path = str(tmp_path / "hierarchy.npz")
+    built["segments"].save(path, "key")
+    loaded = route.ContractionHierarchy.load(path, "key")
+    assert loaded.rank == built["segments"].rank and loaded.via == built["segments"].via
+    assert route.ContractionHierarchy.load(path, "other sources") is None
+
+
+@pytest.mark.parametrize("artifact", [route.ContractionHierarchy, route.Landmarks])
+def test_saved_artifacts_of_another_version_are_rejected(hierarchies, artifact, tmp_path, monkeypatch):
+    router, built = hierarchies
+    saved = built["segments"] if artifact is route.ContractionHierarchy else route.Landmarks.build(router.graph, 2)
+    path = str(tmp_path / "artifact.npz")
+    saved.save(path, "key")
+    assert artifact.load(path, "key") is not None
+    monkeypatch.setattr(route, "GRAPH_CACHE_VERSION", route.GRAPH_CACHE_VERSION + 1)
+    assert artifact.load(path, "key") is None
+    saved.save(path, "key")
+    monkeypatch.setattr(artifact, "VERSION", artifact.VERSION + 1)
+    assert artifact.load(path, "key") is None
+
+
+@pytest.mark.parametrize("cost", route.COST_FUNCTIONS)
+def test_landmark_heuristic_is_admissible_and_optimal(cost):
+    router = route.Router(use_hierarchies=False, use_landmarks=False)
+    router.landmarks = route.Landmarks.build(router.graph, 4)
+    assert len(set(router.landmarks.nodes.tolist())) == 4
+    pairs = random_pairs(router, 10, 5)
+    for start, end in pairs[:3]:
+        goal = router.index[end]
+        heuristic = router.heuristic(cost, goal, "landmarks")
+        for node, best in dijkstra(router, goal, router.costs[cost]).items():
+            assert heuristic[node] <= best, "Heuristic overestimates from %s" % router.names[node]
+    for start, end in pairs:
+        answer = route.findsmallestpath(router, start, end, cost, "landmarks")
+        assert_cheapest(router, answer, start, end, router.costs[cost], cost_total(cost))
+
+
+def test_landmarks_are_each_farthest_from_the_ones_before():
+    graph = route.RoadGraph.load()
+    landmarks = route.Landmarks.build(graph, 4)
+    miles = landmarks.low["distance"]
+    for i in range(1, 4):
+        nearest = miles[:i].min(axis=0)
+        nearest = np.where(np.isfinite(nearest), nearest, -1)
+        assert nearest[landmarks.nodes[i]] >= nearest.max() - 1, "Landmark %d isn't the farthest from the others" % i
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_distance_matrix_matches_dijkstra(workers, tmp_path):
+    router = route.default_router()
+    sources = [start for start, end in random_pairs(router, 6, 13)]
+    targets = [end for start, end in random_pairs(router, 9, 17)]
+    output = str(tmp_path / "matrix.npy")
+    matrix = route.distance_matrix(sources, targets, "distance", workers=workers, output=output)
+    assert matrix.shape == (6, 9)
+    for row, source in enumerate(sources):
+        gscore = dijkstra(router, router.index[source], router.costs["distance"])
+        assert matrix[row].tolist() == [gscore.get(router.index[target], math.inf) for target in targets]
+    assert np.array_equal(np.load(output), matrix)
+
+
+@pytest.mark.parametrize("cost", route.COST_FUNCTIONS)
+def test_bidirectional_search_is_optimal(cost):
+    router = route.Router(use_hierarchies=False)
+    for start, end in random_pairs(router, 15, 19) + [("Bloomington,_Indiana", "Bloomington,_Indiana")]:
+        answer = route.findpathbidirectional(router, start, end, cost)
+        assert_cheapest(router, answer, start, end, router.costs[cost], cost_total(cost))
+        if answer:
+            assert [step[0] for step in answer["route-taken"][-1:]] == ([end] if start != end else [])
+
+
+def test_route_keeps_the_parallel_road_it_took():
+    router = route.Router(use_hierarchies=False)
+    # two roads join these cities: US_1, 12 miles at 52 mph, and Florida's_Tpk, 13 miles at 65 mph
+    answer = route.findsmallestpath(router, "Cutler_Ridge,_Florida", "Florida_City,_Florida", "time")
+    assert answer["route-taken"] == [("Florida_City,_Florida", "Florida's_Tpk for 13 miles")]
+    assert answer["total-hours"] == pytest.approx(0.2)
+
+
+def test_spatial_index_matches_a_scan():
+    router = route.default_router()
+    index = router.spatial_index()
+    located = np.flatnonzero(~np.isnan(router.graph.latitude))
+    rng = random.Random(23)
+    for _ in range(50):
+        latitude, longitude = rng.uniform(25, 60), rng.uniform(-130, -60)
+        miles = [route.great_circle_miles(latitude, longitude, router.graph.latitude[node],
+                                          router.graph.longitude[node]) for node in located]
+        nearest = index.nearest(latitude, longitude, 3)
+        assert [distance for node, distance in nearest] == pytest.approx(sorted(miles)[:3], abs=1e-6)
+        radius = sorted(miles)[10] + 1e-6
+        assert sorted(node for node, distance in index.within(latitude, longitude, radius)) == \
+            sorted(node for node, distance in zip(located, miles) if distance <= radius)
+
+
+def test_route_between_points_snaps_to_cities():
+    answer = route.get_route_between_points((39.1653, -86.5264), (39.7684, -86.1581), "distance")
+    assert (answer["start-city"], answer["end-city"]) == ("Bloomington,_Indiana", "Indianapolis,_Indiana")
+    assert answer["total-miles"] <= 51
+
+
+@pytest.mark.parametrize("cost", ["distance", "time"])
+def test_k_routes_are_loopless_and_the_second_is_the_cheapest_detour(cost):
+    router = route.default_router()
+    costs = router.costs[cost]
+    for start, end in random_pairs(router, 5, seed=23):
+        routes = route.findkroutes(router, start, end, cost, count=4)
+        totals = [answer[TOTALS[cost]] for answer in routes]
+        assert totals == sorted(totals)
+        assert totals[0] == pytest.approx(route.get_route(start, end, cost)[TOTALS[cost]])
+        paths = []
+        for answer in routes:
+            cities = [start] + [step[0] for step in answer["route-taken"]]
+            assert len(set(cities)) == len(cities)
+            paths.append(tuple(answer["route-taken"]))
+        assert len(set(paths)) == len(paths)
+        # the second cheapest route must leave the cheapest one somewhere: it is the best route avoiding one of its edges
+        source, target, zero = router.node(start), router.node(end), [0] * len(router.names)
+        first = route.spur_search(router, costs, zero, source, target, set(), set())[1]
+        detours = [route.spur_search(router, costs, zero, source, target, set(), {edge}) for edge in first]
+        assert totals[1] == pytest.approx(min(found[0] for found in detours if found is not None))
+
+
+def test_k_routes_respect_the_overlap_limit():
+    routes = route.get_routes("Bloomington,_Indiana", "Chicago,_Illinois", "distance", count=4, max_overlap=0.5)
+    assert len(routes) == 4
+    taken = set()
+    for answer in routes:
+        cities = ["Bloomington,_Indiana"] + [step[0] for step in answer["route-taken"]]
+        roads = [(frozenset(pair), step[1]) for pair, step in zip(zip(cities, cities[1:]), answer["route-taken"])]
+        shared = sum(float(road[1].split()[-2]) for road in roads if road in taken)
+        assert shared <= 0.5 * answer["total-miles"]
+        taken.update(roads)
+
+
+@pytest.fixture(scope="module")
+def server():
+    instance = route_server.RouteServer(workers=2, cache_size=2)
+    loop = asyncio.new_event_loop()
+    bound = queue.Queue()
+    serving = loop.create_task(instance.serve("127.0.0.1", 0, ready=bound.put))
+
+    def run():
+        try:
+            loop.run_until_complete(serving)
+        except asyncio.CancelledError:
+            loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    yield instance, bound.get(timeout=30)
+    loop.call_soon_threadsafe(serving.cancel)
+    thread.join()
+    instance.close()
+
+
+def test_server_answers_json_lines_in_order(server):
+    instance, address = server
+    queries = [{"start": "Bloomington,_Indiana", "end": "Chicago,_Illinois", "cost": cost} for cost in route.COST_FUNCTIONS]
+    queries.insert(2, {"start": "Atlantis,_Indiana", "end": "Chicago,_Illinois", "cost": "time"})
+    with socket.create_connection(address) as connection:
+        connection.sendall(b"".join(json.dumps(query).encode() + b"\n" for query in queries) + b"not json\n")
+        connection.shutdown(socket.SHUT_WR)
+        lines = connection.makefile().read().splitlines()
+    answers = [json.loads(line) for line in lines]
+    assert len(answers) == len(queries) + 1
+    assert "unknown city" in answers[2]["error"] and "error" in answers[-1]
+    del answers[2]
+    for cost, answer in zip(route.COST_FUNCTIONS, answers):
+        expected = route.get_route("Bloomington,_Indiana", "Chicago,_Illinois", cost)
+        assert answer[TOTALS[cost]] == pytest.approx(expected[TOTALS[cost]])
+        assert [tuple(step) for step in answer["route-taken"]] == expected["route-taken"]
+
+
+def test_server_answers_http_and_caches_recent_queries(server):
+    instance, address = server
+    url = "http://%s:%d" % address
+    query = {"start": "Bloomington,_Indiana", "end": "Indianapolis,_Indiana", "cost": "distance"}
+    before = instance.stats()["cache-hits"]
+    with urllib.request.urlopen(url + "/route?" + urllib.parse.urlencode(query)) as response:
+        first = json.load(response)
+    with urllib.request.urlopen(url + "/route", data=json.dumps(query).encode()) as response:
+        second = json.load(response)
+    assert first == second and first["total-miles"] == route.get_route(**query)["total-miles"]
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(url + "/route?start=Atlantis,_Indiana&end=Chicago,_Illinois&cost=time")
+    assert error.value.code == 400
+    with urllib.request.urlopen(url + "/stats") as response:
+        stats = json.load(response)
+    assert stats["cache-hits"] == before + 1 and stats["cached-queries"] <= 2
+    assert stats["latency"]["cached"]["count"] >= 1 and stats["latency"]["distance"]["count"] >= 1
+
+
+def test_weighted_route_is_the_cheapest_under_the_blend():
+    router = route.Router(use_hierarchies=False)
+    weights = {"time": 1, "safe": 1000, "distance": 0.01}
+    edge_weights = router.edge_weights(weights)
+
+    def blended(answer):
+        return answer["total-hours"] + 1000 * answer["total-expected-accidents"] + 0.01 * answer["total-miles"]
+
+    for start, end in random_pairs(router, 10, 25):
+        answer = route.findweightedpath(router, start, end, edge_weights,
+                                        router.weight_heuristic(weights, router.index[end]))
+        assert_cheapest(router, answer, start, end, edge_weights, blended)
+
+
+def test_lexicographic_route_breaks_ties_with_the_second_cost():
+    # safe costs are whole numbers far below 10 ** 6, so safe * 10 ** 6 + time orders routes the same way
+    router = route.Router(use_hierarchies=False)
+    blend = (np.array(router.costs["safe"]) * 10 ** 6 + np.array(router.costs["time"])).tolist()
+    for start, end in random_pairs(router, 10, 26):
+        answer = route.get_weighted_route(start, end, ("safe", "time"))
+        best = dijkstra(router, router.index[start], blend).get(router.index[end])
+        if best is None:
+            assert answer == ""
+        else:
+            assert answer["total-expected-accidents"] == pytest.approx(best // 10 ** 6 / 10 ** 6)
+            assert answer["total-hours"] == pytest.approx(best % 10 ** 6, abs=1e-6)
+
+
+def test_pareto_routes_are_a_front_holding_every_blend_optimum():
+    router = route.Router(use_hierarchies=False)
+    for start, end in random_pairs(router, 4, 27) + [("Bloomington,_Indiana", "Chicago,_Illinois")]:
+        routes = route.findparetoroutes(router, start, end, ("time", "safe"))
+        if not routes:
+            assert route.get_route(start, end, "time") == ""
+            continue
+        hours = [answer["total-hours"] for answer in routes]
+        accidents = [answer["total-expected-accidents"] for answer in routes]
+        assert hours == sorted(hours) and accidents == sorted(accidents, reverse=True)
+        assert len(set(zip(hours, accidents))) == len(routes)
+        assert hours[0] == pytest.approx(route.get_route(start, end, "time")["total-hours"])
+        assert accidents[-1] == pytest.approx(route.get_route(start, end, "safe")["total-expected-accidents"])
+        for factor in (100, 1000, 10000):
+            answer = route.get_weighted_route(start, end, {"time": 1, "safe": factor})
+            best = answer["total-hours"] + factor * answer["total-expected-accidents"]
+            assert min(h + factor * a for h, a in zip(hours, accidents)) == pytest.approx(best)
+
+
+@pytest.mark.parametrize("request_bytes", [b"GET \r\n\r\n", b"POST /route HTTP/1.1\r\nContent-Length: abc\r\n\r\n{}",
+                                           b"POST /route HTTP/1.1\r\nContent-Length: 99999999\r\n\r\n",
+                                           b"POST /route HTTP/1.1\r\nContent-Length: 50\r\n\r\n{}",
+                                           b"GET /route?start=" + b"x" * route_server.MAX_BODY + b" HTTP/1.1\r\n\r\n"],
+                         ids=["request-line", "content-length", "large-body", "short-body", "long-line"])
+def test_server_rejects_malformed_http_requests(server, request_bytes):
+    instance, address = server
+    before = instance.stats()["errors"]
+    with socket.create_connection(address) as connection:
+        connection.sendall(request_bytes)
+        connection.shutdown(socket.SHUT_WR)
+        reply = connection.makefile("rb").read()
+    status, _, body = reply.partition(b"\r\n\r\n")
+    assert status.startswith(b"HTTP/1.1 400") and "error" in json.loads(body)
+    assert instance.stats()["errors"] == before + 1
+
+
+def test_server_answers_lines_over_the_limit_and_goes_on(server):
+    instance, address = server
+    query = {"start": "Bloomington,_Indiana", "end": "Indianapolis,_Indiana", "cost": "distance"}
+    with socket.create_connection(address) as connection:
+        connection.sendall(b"x" * (2 * route_server.MAX_BODY) + b"\n" + json.dumps(query).encode() + b"\n")
+        connection.shutdown(socket.SHUT_WR)
+        lines = connection.makefile().read().splitlines()
+    answers = [json.loads(line) for line in lines]
+    assert len(answers) == 2 and "over" in answers[0]["error"]
+    assert answers[1]["total-miles"] == route.get_route(**query)["total-miles"]